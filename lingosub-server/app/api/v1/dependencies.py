@@ -1,9 +1,14 @@
+import hmac
+
 from fastapi import Security, HTTPException, status
 from fastapi.security import APIKeyHeader
 from app.core.config import settings
 
 api_key_header = APIKeyHeader(name="Authorization", auto_error=True)
 
+# Encoded once so every request compares raw bytes in constant time.
+_EXPECTED_KEY = settings.API_KEY.encode("utf-8")
+
 
 async def get_api_key(api_key_header: str = Security(api_key_header)):
     """
@@ -17,7 +22,8 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
         )
 
     scheme, _, key = api_key_header.partition(" ")
-    if scheme.lower() != "bearer" or key != settings.API_KEY:
+    provided = key.encode("utf-8")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(provided, _EXPECTED_KEY):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API Key",
@@ -1,107 +1,275 @@
 import uuid
-import shutil
-from pathlib import Path
+import asyncio
+from pathlib import Path, PurePosixPath
 import logging
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+from cachetools import TTLCache
 
 from fastapi import (
-    APIRouter, UploadFile, File, Form, Depends, HTTPException, status, Response
+    APIRouter, UploadFile, File, Form, Depends, HTTPException, status, Request, Header
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
-from celery.result import AsyncResult
+from celery import states
 
 from app.api.v1.schemas import TaskCreationResponse, TaskStatusResponse
 from app.api.v1.dependencies import get_api_key
-from app.worker.tasks import translate_srt_task
+from app.worker.tasks import (
+    translate_srt_task, stage_source, result_cache_key, find_cached_result, compressed_path
+)
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+_ALLOWED_SUFFIXES = frozenset({".srt"})
 
-@router.post("/tasks", response_model=TaskCreationResponse, status_code=status.HTTP_202_ACCEPTED)
-async def create_translation_task(
-    file: UploadFile = File(...),
-    target_language: str = Form(...),
-    model: str = Form("gpt-4.1-mini"),
-    api_key: str = Depends(get_api_key)
-):
+_SRT_TOO_LARGE_DETAIL = f"SRT file too large. Maximum size is {settings.MAX_SRT_SIZE} bytes."
+
+# Admission control for the upload I/O section (body read + Redis staging), so a burst
+# of large uploads queues here instead of exhausting the worker thread pool.
+MAX_CONCURRENT_UPLOADS = 16
+_upload_semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+# How long the result endpoint waits for a running task to finish before answering 404.
+RESULT_WAIT_TIMEOUT = 1.0
+
+# Async client for the result backend, used to wait on task-meta notifications
+# without blocking the event loop.
+result_redis = aioredis.from_url(settings.CELERY_RESULT_BACKEND)
+
+# Short-lived cache of non-terminal task meta so that clients polling the same
+# task share one backend read per window. Terminal states are never cached.
+STATUS_CACHE_TTL = 0.5
+_status_cache: TTLCache = TTLCache(maxsize=10_000, ttl=STATUS_CACHE_TTL)
+
+# Upper bound on the number of task ids accepted by the batch status endpoint.
+MAX_BATCH_STATUS_IDS = 500
+
+
+async def _get_cached_task_meta(task_id: str) -> Dict[str, Any]:
+    """Returns the task meta, served from the status cache while the task is still running."""
+    meta = _status_cache.get(task_id)
+    if meta is None:
+        meta = await run_in_threadpool(translate_srt_task.app.backend.get_task_meta, task_id)
+        if meta["status"] not in states.READY_STATES:
+            _status_cache[task_id] = meta
+    return meta
+
+
+async def _wait_for_task_meta(task_id: str, timeout: float) -> Optional[Dict[str, Any]]:
     """
-    Uploads an SRT file and starts an asynchronous translation task.
+    Returns the task meta once the task is ready, or the latest meta seen when the timeout expires.
+    Celery's Redis backend publishes every meta write on the channel named after the meta key,
+    so we subscribe before the first GET to avoid missing a write in between.
     """
-    logger.info(f"Received translation task: file={file.filename}, target_language={target_language}, model={model}")
-    if not file.filename or not file.filename.endswith(".srt"):
+    backend = translate_srt_task.app.backend
+    key = backend.get_key_for_task(task_id)
+    meta = None
+    async with result_redis.pubsub() as pubsub:
+        await pubsub.subscribe(key)
+        payload = await result_redis.get(key)
+        if payload is not None:
+            meta = backend.decode_result(payload)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while meta is None or meta["status"] not in states.READY_STATES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                meta = backend.decode_result(message["data"])
+    return meta
+
+
+def _validate_filename(filename: Optional[str]):
+    """Rejects uploads that are not SRT files."""
+    if not filename or PurePosixPath(filename).suffix.lower() not in _ALLOWED_SUFFIXES:
         logger.warning("Invalid file type uploaded.")
         raise HTTPException(status_code=400, detail="Invalid file type. Only .srt files are accepted.")
-    
-    temp_dir = Path(settings.TEMP_FILE_DIR)
-    temp_dir.mkdir(exist_ok=True)
-    file_path = temp_dir / f"{uuid.uuid4()}_{file.filename}"
-    
+
+
+def _check_declared_size(request: Request):
+    """Rejects a request whose declared Content-Length already exceeds the upload limit."""
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logger.info(f"File saved to {file_path}")
-    finally:
-        file.file.close()
+        declared = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length header.")
+    if declared > settings.MAX_SRT_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=_SRT_TOO_LARGE_DETAIL)
+
+
+async def _enqueue_translation(data: bytes, filename: str, target_language: str, model: str) -> Dict[str, Any]:
+    """Stages the uploaded bytes and starts the Celery task, reusing an identical finished task if any."""
+    # Reuse a finished task when the same content was already translated with the same options.
+    cache_key = result_cache_key(data, target_language, model)
+    cached_task_id = await run_in_threadpool(find_cached_result, cache_key)
+    if cached_task_id:
+        meta = await _get_cached_task_meta(cached_task_id)
+        if meta["status"] == states.SUCCESS and Path(meta["result"]["result_path"]).is_file():
+            logger.info("Reusing result of task_id=%s for identical upload", cached_task_id)
+            return {"task_id": cached_task_id, "status": "SUCCESS"}
+
+    # SRT files are small, so hand the bytes to the worker through Redis
+    # instead of a shared temp directory.
+    source_key = await run_in_threadpool(stage_source, data)
+    logger.info("Staged %s bytes under %s", len(data), source_key)
 
     # Start the Celery task
     task = translate_srt_task.delay(
-        source_file_path=str(file_path), 
+        source_key=source_key,
+        filename=filename,
         target_language=target_language,
         model=model
     )
-    logger.info(f"Celery task started: task_id={task.id}")
+    logger.info("Celery task started: task_id=%s", task.id)
 
     return {"task_id": task.id, "status": "PENDING"}
 
 
+@router.post("/tasks", response_model=TaskCreationResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_translation_task(
+    file: UploadFile = File(...),
+    target_language: str = Form(...),
+    model: str = Form("gpt-4.1-mini"),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Uploads an SRT file and starts an asynchronous translation task.
+    """
+    logger.info("Received translation task: file=%s, target_language=%s, model=%s", file.filename, target_language, model)
+    _validate_filename(file.filename)
+
+    # The form has already been parsed at this point, and the request's Content-Length
+    # also counts the boundaries and other fields, so the limit is checked on the file alone.
+    async with _upload_semaphore:
+        try:
+            if file.size is not None and file.size > settings.MAX_SRT_SIZE:
+                raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=_SRT_TOO_LARGE_DETAIL)
+            data = await file.read()
+        finally:
+            await file.close()
+
+        return await _enqueue_translation(data, file.filename, target_language, model)
+
+
+@router.post("/tasks/stream", response_model=TaskCreationResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_translation_task_stream(
+    request: Request,
+    x_filename: str = Header(...),
+    x_target_language: str = Header(...),
+    x_model: str = Header("gpt-4.1-mini"),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Starts a translation task from a raw SRT request body.
+    Options are passed in X-Filename, X-Target-Language and X-Model headers,
+    so the body is read as it arrives without multipart parsing or spooling.
+    """
+    logger.info("Received streamed translation task: file=%s, target_language=%s, model=%s", x_filename, x_target_language, x_model)
+    _check_declared_size(request)
+    _validate_filename(x_filename)
+
+    async with _upload_semaphore:
+        data = bytearray()
+        async for chunk in request.stream():
+            data.extend(chunk)
+            # Content-Length may be absent (chunked) or wrong, so enforce the limit on the bytes received.
+            if len(data) > settings.MAX_SRT_SIZE:
+                raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=_SRT_TOO_LARGE_DETAIL)
+
+        return await _enqueue_translation(bytes(data), x_filename, x_target_language, x_model)
+
+
+def _build_status_response(task_id: uuid.UUID, meta: Dict[str, Any]) -> TaskStatusResponse:
+    """
+    Maps Celery task meta to a TaskStatusResponse.
+    """
+    task_status = meta["status"]
+    task_info = meta["result"]
+    progress = None
+    error_message = None
+    
+    if task_status == 'PENDING':
+        pass
+    elif task_status == "PROCESSING":
+        progress = task_info.get("progress", 0)
+    elif task_status == "SUCCESS":
+        progress = 1.0
+    elif task_status == "FAILURE":
+        error_message = str(task_info)
+    return TaskStatusResponse(
+        task_id=task_id,
+        status=task_status,
+        progress=progress,
+        error_message=error_message,
+    )
+
+
 @router.get("/tasks/{task_id}/status", response_model=TaskStatusResponse)
 async def get_task_status(task_id: uuid.UUID, api_key: str = Depends(get_api_key)):
     """
     Retrieves the current status of a translation task.
     """
-    logger.info(f"Checking status for task_id={task_id}")
-    task_result = AsyncResult(str(task_id), app=translate_srt_task.app)
+    logger.info("Checking status for task_id=%s", task_id)
+    meta = await _get_cached_task_meta(str(task_id))
+    response = _build_status_response(task_id, meta)
     
-    response_data = {
-        "task_id": task_id,
-        "status": task_result.status,
-    }
-    
-    if task_result.status == 'PENDING':
-        pass
-    elif task_result.status == "PROCESSING":
-        response_data["progress"] = task_result.info.get("progress", 0)
-    elif task_result.status == "SUCCESS":
-        response_data["progress"] = 1.0
-    elif task_result.status == "FAILURE":
-        response_data["error_message"] = str(task_result.info)
-    
-    logger.info(f"Task status for task_id={task_id}: {response_data}")
-    return response_data
+    logger.info("Task status for task_id=%s: %s", task_id, response)
+    return response
+
+
+@router.post("/tasks/status:batch", response_model=List[TaskStatusResponse])
+async def get_task_statuses(task_ids: List[uuid.UUID], api_key: str = Depends(get_api_key)):
+    """
+    Retrieves the status of several translation tasks with a single backend round trip.
+    """
+    if len(task_ids) > MAX_BATCH_STATUS_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_STATUS_IDS} task ids can be queried at once."
+        )
+    logger.info("Checking status for %s tasks", len(task_ids))
+    if not task_ids:
+        return []
+
+    backend = translate_srt_task.app.backend
+    payloads = await result_redis.mget([backend.get_key_for_task(str(task_id)) for task_id in task_ids])
+
+    pending_meta = {"status": states.PENDING, "result": None}
+    return [
+        _build_status_response(task_id, backend.decode_result(payload) if payload is not None else pending_meta)
+        for task_id, payload in zip(task_ids, payloads)
+    ]
+
 
 @router.get("/tasks/{task_id}/result", response_class=FileResponse)
-async def get_task_result(task_id: uuid.UUID, api_key: str = Depends(get_api_key)):
+async def get_task_result(request: Request, task_id: uuid.UUID, api_key: str = Depends(get_api_key)):
     """
     Retrieves the result of a completed translation task.
     """
-    logger.info(f"Retrieving result for task_id={task_id}")
-    task_result = AsyncResult(str(task_id), app=translate_srt_task.app)
+    logger.info("Retrieving result for task_id=%s", task_id)
+    meta = await _wait_for_task_meta(str(task_id), RESULT_WAIT_TIMEOUT)
+    task_status = meta["status"] if meta else states.PENDING
 
-    if not task_result.ready():
+    if task_status not in states.READY_STATES:
          raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Result not available. Task status is: {task_result.status}"
+            detail=f"Result not available. Task status is: {task_status}"
         )
     
-    if task_result.failed():
+    if task_status != states.SUCCESS:
          raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Task failed. Error: {str(task_result.info)}"
+            detail=f"Task failed. Error: {str(meta['result'])}"
         )
     
-    result = task_result.get()
+    result = meta["result"]
     result_path = Path(result["result_path"])
 
     if not result_path.is_file():
@@ -110,7 +278,18 @@ async def get_task_result(task_id: uuid.UUID, api_key: str = Depends(get_api_key
             detail="Result file not found."
         )
 
-    logger.info(f"Result file found: {result_path}")
+    logger.info("Result file found: %s", result_path)
+
+    # Serve the pre-compressed copy written by the worker when the client accepts gzip.
+    gz_path = compressed_path(result_path)
+    if "gzip" in request.headers.get("accept-encoding", "").lower() and gz_path.is_file():
+        return FileResponse(
+            path=gz_path,
+            media_type="application/x-subrip",
+            filename=f"translated_{task_id}.srt",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+
     return FileResponse(
         path=result_path,
         media_type="application/x-subrip",
@@ -20,13 +20,24 @@ class Settings(BaseSettings):
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
     TEMP_FILE_DIR: str = "temp_files"
     RESULT_FILE_DIR: str = "result_files"
+    # 每个进程到 Redis 的最大连接数
+    REDIS_MAX_CONNECTIONS: int = 20
+    # 上传 SRT 文件的最大字节数
+    MAX_SRT_SIZE: int = 10 * 1024 * 1024
 
     # OpenAI API settings
     OPENAI_API_KEY: str = "your_openai_api_key_here"
     OPENAI_BASE_URL: Optional[str] = None
+    # 服务商每分钟允许的请求数
+    OPENAI_REQUESTS_PER_MINUTE: int = 500
+    # 每分钟允许消耗的模型 token 数（估算值），用于限流
+    OPENAI_TOKENS_PER_MINUTE: int = 200_000
+    # 同时进行中的翻译请求上限
+    OPENAI_MAX_CONCURRENCY: int = 8
 
     # 如果 .env 文件存在，则从中加载
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8')
+    # frozen: settings are read-only after startup
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', frozen=True)
 
 
 settings = Settings()
\ No newline at end of file
@@ -1,15 +1,34 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from starlette.middleware.gzip import GZipMiddleware
+import anyio.to_thread
 import logging
 from app.api.v1.endpoints import tasks
 
 logger = logging.getLogger(__name__)
 
+# Size of the anyio worker thread pool used for sync I/O offloaded from endpoints.
+THREAD_POOL_SIZE = 128
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREAD_POOL_SIZE
+    logger.info("Thread pool size set to %s.", THREAD_POOL_SIZE)
+    yield
+
+
 app = FastAPI(
     title="LingoSub API",
     description="API for translating SRT subtitle files using AI.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Compress JSON responses and SRT downloads for clients that accept gzip.
+# Responses that already carry a Content-Encoding (pre-compressed results) pass through untouched.
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
+
 # Include the API router
 app.include_router(tasks.router, prefix="/api/v1", tags=["tasks"])
 
@@ -1,46 +1,138 @@
+import asyncio
 import time
 import logging
+from typing import Optional
 from redis import Redis
 
 logger = logging.getLogger(__name__)
 
+# Multi-bucket token bucket refill-and-take, executed atomically in a single round trip.
+# Either every bucket pays its cost or none does, so a request permit is never consumed
+# while the caller is still waiting for token budget.
+# KEYS[i]=bucket i, ARGV[1]=now, ARGV[2]=ttl (s), then per bucket: rate (units/s), capacity, cost
+# Returns the seconds to wait before retrying, "0" when the permit was taken.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local base = 2 + (i - 1) * 3
+    local rate = tonumber(ARGV[base + 1])
+    local capacity = tonumber(ARGV[base + 2])
+    local cost = tonumber(ARGV[base + 3])
+    local data = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+    levels[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    if wait == 0 then
+        levels[i] = levels[i] - tonumber(ARGV[2 + (i - 1) * 3 + 3])
+    end
+    redis.call('HSET', key, 'tokens', tostring(levels[i]), 'ts', tostring(now))
+    redis.call('EXPIRE', key, ARGV[2])
+end
+return tostring(wait)
+"""
+
+# Drains a request bucket and extends its TTL in one atomic step, so no acquire can land
+# in between and the key never outlives its TTL.
+# KEYS[1]=bucket, ARGV[1]=tokens, ARGV[2]=now, ARGV[3]=ttl (s)
+PAUSE_SCRIPT = """
+redis.call('HSET', KEYS[1], 'tokens', ARGV[1], 'ts', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
 class RateLimiter:
     """
-    A simple fixed-window rate limiter using Redis.
+    A token bucket rate limiter using Redis.
+    The request bucket holds up to `limit` permits and refills at `limit / period` permits per second.
+    An optional second bucket budgets model tokens: `token_limit` per `token_period` seconds.
     """
-    def __init__(self, redis_client: Redis, key: str, limit: int, period: int):
+    def __init__(self, redis_client: Redis, key: str, limit: int, period: int,
+                 token_limit: Optional[int] = None, token_period: int = 60):
         """
         :param redis_client: An instance of a Redis client.
         :param key: The base key to use for storing rate limit data in Redis.
         :param limit: The number of allowed requests per period.
         :param period: The time period in seconds.
+        :param token_limit: The number of allowed model tokens per token_period, or None for no token budget.
+        :param token_period: The token budget period in seconds.
         """
         self.redis = redis_client
         self.key = key
         self.limit = limit
         self.period = period
+        self.rate = limit / period
+        self.token_key = f"{key}:tokens"
+        self.token_limit = token_limit
+        self.token_rate = token_limit / token_period if token_limit else None
+        # An idle bucket is full again after one period, so its state can expire then.
+        self.ttl = max(1, int(max(period, token_period if token_limit else 0)) + 1)
+        self._take_token = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._drain = self.redis.register_script(PAUSE_SCRIPT)
+
+    def _try_acquire(self, tokens: int = 0, permits: int = 1) -> float:
+        """
+        Tries to take `permits` request permits and `tokens` model tokens in one round trip.
+        Returns 0 on success, otherwise the seconds to wait until the buckets have refilled enough.
+        """
+        keys = [self.key]
+        # More permits than the bucket holds would never fit; cap them like the token cost below.
+        args = [time.time(), self.ttl, self.rate, self.limit, min(permits, self.limit)]
+        if self.token_limit:
+            keys.append(self.token_key)
+            # A request larger than the whole budget would never fit; let it drain the bucket instead.
+            args += [self.token_rate, self.token_limit, min(tokens, self.token_limit)]
 
-    def acquire(self):
+        wait_time = float(self._take_token(keys=keys, args=args))
+
+        if not wait_time:
+            logger.debug(f"Rate limit acquired {permits} permit(s) for {tokens} tokens.")
+            return 0.0
+
+        logger.warning(
+            f"Rate limit exceeded ({self.limit}/{self.period}s). "
+            f"Waiting for {wait_time:.2f}s for the next permit."
+        )
+        return wait_time
+
+    def acquire(self, tokens: int = 0, permits: int = 1):
         """
-        Acquires a permit from the rate limiter. Blocks until a permit is available.
+        Acquires `permits` permits from the rate limiter. Blocks until they are available.
         """
         while True:
-            current_window = int(time.time() // self.period)
-            redis_key = f"{self.key}:{current_window}"
-            
-            p = self.redis.pipeline()
-            p.incr(redis_key)
-            p.expire(redis_key, self.period)
-            count, _ = p.execute()
-
-            if count <= self.limit:
-                logger.debug(f"Rate limit permit acquired. Count: {count}/{self.limit}")
+            wait_time = self._try_acquire(tokens, permits)
+            if not wait_time:
                 return True
-            else:
-                # Calculate how long to wait before the next window starts.
-                wait_time = self.period - (time.time() % self.period)
-                logger.warning(
-                    f"Rate limit exceeded ({self.limit}/{self.period}s). "
-                    f"Waiting for {wait_time:.2f}s for the next window."
-                )
-                time.sleep(wait_time) 
\ No newline at end of file
+            time.sleep(wait_time)
+
+    async def acquire_async(self, tokens: int = 0, permits: int = 1):
+        """
+        Acquires `permits` permits from the rate limiter without blocking the event loop.
+        The Redis round trip runs in a worker thread, so other requests on the loop keep streaming.
+        """
+        while True:
+            wait_time = await asyncio.to_thread(self._try_acquire, tokens, permits)
+            if not wait_time:
+                return True
+            await asyncio.sleep(wait_time)
+
+    def pause(self, seconds: float):
+        """
+        Drains the request bucket so that the next permit is granted after `seconds`.
+        Used when the provider reports its own limit as exhausted (e.g. Retry-After).
+        """
+        self._drain(keys=[self.key], args=[1 - seconds * self.rate, time.time(), self.ttl + int(seconds) + 1])
+        logger.warning(f"Provider rate limit reached. Pausing requests for {seconds:.2f}s.")
+
+    async def pause_async(self, seconds: float):
+        """
+        Same as pause(), with the Redis round trip run in a worker thread.
+        """
+        await asyncio.to_thread(self.pause, seconds)
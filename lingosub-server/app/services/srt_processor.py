@@ -1,38 +1,90 @@
 import logging
-import pysrt
+import mmap
+import re
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Any
-from itertools import groupby
+from typing import Iterator, List, Dict, Any, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# One SRT entry: index line, timing line (with optional position suffix), then
+# every following non-blank line as text. Runs over raw bytes so it can scan an mmap.
+_SRT_ENTRY_RE = re.compile(
+    rb"(\d+)[ \t]*\r?\n"
+    rb"(\d+:\d\d:\d\d[,.]\d+)[ \t]*-->[ \t]*(\d+:\d\d:\d\d[,.]\d+)([^\r\n]*)"
+    rb"((?:\r?\n[ \t]*[^\s][^\r\n]*)*)"
+)
+
+
+@dataclass
+class Subtitle:
+    index: int
+    start: str
+    end: str
+    text: str
+    position: str = ""
+
+
 class SRTProcessor:
     """
     Handles reading, parsing, processing, and writing SRT files.
     Uses a list of dictionaries as the intermediate format.
     """
     SUBTITLE_SEPARATOR = "|||"
+    # Number of formatted entries joined into one write() call when saving.
+    WRITE_CHUNK_ENTRIES = 512
 
-    def __init__(self, file_path: str):
-        self.file_path = Path(file_path)
-        if not self.file_path.is_file():
+    def __init__(self, file_path: Optional[str] = None, content: Optional[bytes] = None, name: Optional[str] = None):
+        """
+        :param file_path: Path of an SRT file on disk.
+        :param content: Raw SRT bytes, used instead of reading from disk.
+        :param name: A display name for logging when parsing from content.
+        """
+        if file_path is None and content is None:
+            raise ValueError("Either file_path or content must be provided.")
+        self.file_path = Path(file_path) if file_path is not None else None
+        if self.file_path is not None and not self.file_path.is_file():
             raise FileNotFoundError(f"SRT file not found at {file_path}")
+        self.content = content
+        self.name = name or (str(self.file_path) if self.file_path else "<memory>")
         self.subs = None
         self.original_texts = []
+        # Translated lines per original subtitle index, filled batch by batch
+        self._translated_lines: Dict[int, List[Optional[str]]] = {}
 
     def parse(self):
         """
         Parses the SRT file into a list of subtitle objects.
         """
-        logger.info(f"Parsing SRT file: {self.file_path}")
+        logger.info(f"Parsing SRT file: {self.name}")
         try:
-            self.subs = pysrt.open(str(self.file_path), encoding='utf-8')
+            if self.content is not None:
+                self.subs = self._parse_bytes(self.content)
+            elif self.file_path.stat().st_size == 0:
+                self.subs = []
+            else:
+                with open(self.file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    self.subs = self._parse_bytes(mm)
             # self.original_texts = [sub.text for sub in self.subs]
             logger.info(f"Successfully parsed {len(self.subs)} subtitle entries.")
         except Exception as e:
-            logger.error(f"Failed to parse SRT file {self.file_path}: {e}", exc_info=True)
+            logger.error(f"Failed to parse SRT file {self.name}: {e}", exc_info=True)
             raise
 
+    @staticmethod
+    def _parse_bytes(data: Union[bytes, mmap.mmap]) -> List[Subtitle]:
+        """Extracts all subtitle entries from raw SRT bytes in a single regex pass."""
+        return [
+            Subtitle(
+                index=int(m[1]),
+                start=m[2].replace(b".", b",").decode("ascii"),
+                end=m[3].replace(b".", b",").decode("ascii"),
+                text=m[5].decode("utf-8").replace("\r\n", "\n").lstrip("\n"),
+                position=m[4].decode("utf-8").strip(),
+            )
+            for m in _SRT_ENTRY_RE.finditer(data)
+        ]
+
     def batch_for_translation(self, batch_size: int = 100) -> List[List[Dict[str, Any]]]:
         """
         Creates batches of subtitle objects for translation.
@@ -48,23 +100,29 @@ class SRTProcessor:
             return []
             
         logger.info(f"Splitting multi-line subtitles and batching {len(self.subs)} entries into chunks of {batch_size}.")
-        
-        # Step 1: Create a flat list of "translation units"
-        translation_units = []
-        for sub in self.subs:
-            lines = sub.text.split('\n')
-            for i, line in enumerate(lines):
-                translation_units.append({
-                    "original_index": sub.index,
-                    "sub_index": i,
-                    "text": line
-                })
-
-        # Step 2: Create batches from the flat list
-        batches = [translation_units[i:i + batch_size] for i in range(0, len(translation_units), batch_size)]
-        logger.info(f"Successfully created {len(batches)} batches from {len(translation_units)} translation units.")
+        batches = list(self.iter_batches(batch_size))
+        logger.info(f"Successfully created {len(batches)} batches.")
         return batches
 
+    def count_translation_units(self) -> int:
+        """Returns the number of translation units (subtitle lines) that iter_batches will yield."""
+        return sum(sub.text.count('\n') + 1 for sub in self.subs or ())
+
+    def iter_batches(self, batch_size: int = 100) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields batches of "translation units", one per subtitle line, building each batch
+        only when it is requested so that just the batches in flight are held in memory.
+        """
+        batch = []
+        for sub in self.subs or ():
+            for i, line in enumerate(sub.text.split('\n')):
+                batch.append({"original_index": sub.index, "sub_index": i, "text": line})
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
     def reconstruct(self, translated_units: List[Dict[str, Any]]):
         """
         Reconstructs the subtitles by grouping and joining translated units.
@@ -73,39 +131,67 @@ class SRTProcessor:
             raise ValueError("Subtitles have not been parsed yet. Call parse() first.")
         
         logger.info(f"Reconstructing subtitles from {len(translated_units)} translated units.")
+        self.add_translated_units(translated_units)
+        self.finish_reconstruction()
 
-        # Create a dictionary for quick lookup of subtitles by index
-        subs_dict = {sub.index: sub for sub in self.subs}
+    def add_translated_units(self, translated_units: List[Dict[str, Any]]):
+        """
+        Files a batch of translated units under their subtitles, so the batch itself can be
+        dropped. Call finish_reconstruction() once every batch has been added.
+        """
+        # Bucket the translated lines per original subtitle, placed by sub_index,
+        # in one pass without sorting.
+        buckets = self._translated_lines
+        for unit in translated_units:
+            lines = buckets.get(unit['original_index'])
+            if lines is None:
+                lines = buckets[unit['original_index']] = []
+            sub_index = unit['sub_index']
+            if sub_index >= len(lines):
+                lines.extend([None] * (sub_index - len(lines) + 1))
+            lines[sub_index] = unit['text']
 
-        # Sort units by original_index and then sub_index to ensure correct order
-        translated_units.sort(key=lambda x: (x['original_index'], x['sub_index']))
+    def finish_reconstruction(self):
+        """Replaces each subtitle's text with its translated lines added so far."""
+        if not self.subs:
+            raise ValueError("Subtitles have not been parsed yet. Call parse() first.")
 
-        # Group translated units by their original subtitle index
-        for original_index, group in groupby(translated_units, key=lambda x: x['original_index']):
-            if original_index in subs_dict:
+        buckets, self._translated_lines = self._translated_lines, {}
+        reconstructed = 0
+        for sub in self.subs:
+            lines = buckets.pop(sub.index, None)
+            if lines:
                 # Rejoin the lines for this subtitle
-                sorted_lines = [unit['text'] for unit in sorted(list(group), key=lambda x: x['sub_index'])]
-                subs_dict[original_index].text = '\n'.join(sorted_lines)
-            else:
-                logger.warning(f"Found translated units for an unknown original_index: {original_index}")
+                sub.text = '\n'.join(line for line in lines if line is not None)
+                reconstructed += 1
+
+        for original_index in buckets:
+            logger.warning(f"Found translated units for an unknown original_index: {original_index}")
 
-        # Final check to ensure all original subtitles were processed
-        if len(subs_dict) > 0:
-             logger.info(f"Successfully reconstructed {len(subs_dict)} subtitles.")
+        if reconstructed > 0:
+             logger.info(f"Successfully reconstructed {reconstructed} subtitles.")
+
+    @staticmethod
+    def _format(sub: Subtitle) -> str:
+        """Renders one subtitle entry in SRT format."""
+        position = f" {sub.position}" if sub.position else ""
+        return f"{sub.index}\n{sub.start} --> {sub.end}{position}\n{sub.text}\n\n"
 
     def write(self, output_path: str):
         """
-        Saves the processed subtitles to a new SRT file.
+        Saves the processed subtitles to a new SRT file. The output directory must already exist.
         """
-        if not self.subs:
+        if self.subs is None:
             raise ValueError("No subtitles to write. Process a file first.")
         
         output_path = Path(output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
         
         logger.info(f"Saving processed subtitles to {output_path}")
         try:
-            self.subs.save(str(output_path), encoding='utf-8')
+            chunk = self.WRITE_CHUNK_ENTRIES
+            with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+                for i in range(0, len(self.subs), chunk):
+                    f.write("".join(self._format(sub) for sub in self.subs[i:i + chunk]))
             logger.info("File saved successfully.")
         except Exception as e:
             logger.error(f"Failed to save SRT file to {output_path}: {e}", exc_info=True)
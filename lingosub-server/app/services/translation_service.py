@@ -1,31 +1,129 @@
 import logging
-from typing import Optional, List, Dict, Any
-import json
+from collections import Counter, deque
+from typing import Optional, List, Dict, Any, Tuple
+import asyncio
+import functools
+import hashlib
 import re
-from openai import OpenAI, APIError, RateLimitError
-import time
+import httpx
+import orjson
+import tiktoken
+from openai import AsyncOpenAI, BadRequestError, RateLimitError
 import random
+from cachetools import LRUCache
+from redis import Redis
 
+try:
+    import xxhash
+except ImportError:  # fall back to blake2b if xxhash is not installed
+    xxhash = None
+
+from app.core.config import settings
 from app.services.rate_limiter import RateLimiter
+from app.services.srt_processor import SRTProcessor
 
 logger = logging.getLogger(__name__)
 
 # Define a threshold for switching to single-line translation
 MIN_BATCH_SIZE_FOR_RECURSION = 5
 
-class TranslationService:
-    """
-    A service to handle interactions with the OpenAI API for translation.
-    """
-    def __init__(self, api_key: str, model: str, rate_limiter: RateLimiter, base_url: Optional[str] = None):
-        if not api_key:
-            raise ValueError("API key is required.")
-        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0) # Disable internal retries
-        self.model = model
-        self.rate_limiter = rate_limiter
+# Separator used for the compact first attempt, where a batch is sent as one joined string
+FRAGMENT_SEPARATOR = SRTProcessor.SUBTITLE_SEPARATOR
 
-    def _create_numbered_list_prompt(self, numbered_list: str, target_language: str) -> tuple[str, str]:
-        system_prompt = f"""You are a professional translator. Your task is to translate the text for each numbered line into {target_language}.
+# Translated lines are cached per (model, target language, text digest). Bump the version
+# when prompts change so stale translations are not reused.
+TRANSLATION_CACHE_PREFIX = "tx:v2:"
+TRANSLATION_CACHE_TTL_SECONDS = 14 * 24 * 60 * 60
+
+# Adaptive batch sizing: outcomes are counted per target language and size bucket
+# in Redis, and the largest bucket that reliably comes back well-formed is suggested.
+# Counts are buffered in memory while batches run and flushed once per task.
+BATCH_SIZE_BUCKETS = (25, 50, 100, 200)
+DEFAULT_BATCH_SIZE = 100
+BATCH_STATS_PREFIX = "tx:batch-stats:"
+BATCH_STATS_MIN_SAMPLES = 20
+BATCH_STATS_MIN_SUCCESS_RATE = 0.9
+
+# Connection pool for the model API. HTTP/2 multiplexes concurrent requests over one
+# connection; the pool is kept well above OPENAI_MAX_CONCURRENCY so it never becomes the limit.
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64, keepalive_expiry=120)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+# Input token budget for one batch request, leaving the rest of the context for the output.
+# Batches estimated above it are split before any request is made.
+MODEL_CONTEXT_BUDGET = 6000
+# Single lines estimated above this many tokens are split on sentence boundaries first.
+SINGLE_TEXT_TOKEN_LIMIT = 2000
+_SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?。！？])\s+')
+# Single-text translations kept in memory per service, keyed by (text, target language),
+# so repeated fallback lines and sentence pieces are only requested once.
+SINGLE_TEXT_CACHE_SIZE = 8192
+
+# Per-line (numbering, separators) and per-request (system prompt) overhead in the batch estimate.
+BATCH_LINE_TOKEN_OVERHEAD = 40
+BATCH_PROMPT_TOKEN_OVERHEAD = 300
+
+# Fixed prompt overhead added to the per-request token estimate (system prompt, chat framing, output slack).
+PROMPT_TOKEN_OVERHEAD = 200
+
+# Retries of a request answered with 429, using decorrelated jitter between base and cap seconds
+# when the provider does not say when to retry.
+MAX_RATE_LIMIT_RETRIES = 4
+RATE_LIMIT_BACKOFF_BASE = 1.0
+RATE_LIMIT_BACKOFF_CAP = 30.0
+
+# Durations in OpenAI rate limit reset headers look like "1s", "250ms" or "6m0s".
+_RESET_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_RESET_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+# Structured outputs: the numbered-list request can ask the model for this exact JSON shape.
+NUMBERED_LIST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"i": {"type": "integer"}, "t": {"type": "string"}},
+                "required": ["i", "t"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["items"],
+    "additionalProperties": False,
+}
+STRUCTURED_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "translations", "schema": NUMBERED_LIST_SCHEMA, "strict": True},
+}
+
+# Lines made only of digits, punctuation, symbols (e.g. "♪", "...", "123") or whitespace,
+# or consisting of a single URL, are kept as-is instead of being sent to the model.
+_PASSTHROUGH_RE = re.compile(r'^[\s\W\d]*$')
+_URL_RE = re.compile(r'^https?://\S+$')
+
+# Number prefix of numbered-list response lines such as "12. text".
+_NUMBER_PREFIX_RE = re.compile(r'^\d+\.\s*')
+
+
+def _text_digest(text: str) -> str:
+    """Fast non-cryptographic digest of a subtitle line for translation cache keys."""
+    data = text.encode("utf-8")
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _is_passthrough(text: str) -> bool:
+    """Returns True for lines that need no translation."""
+    return bool(_PASSTHROUGH_RE.match(text) or _URL_RE.match(text))
+
+
+# System prompts are fully static, with the target language carried in the user message,
+# so every request shares a byte-identical prefix that providers can serve from their prompt cache.
+NUMBERED_LIST_SYSTEM_PROMPT = """You are a professional translator. Your task is to translate the text for each numbered line into the target language named on the first line of the user message.
 You MUST respond with a numbered list that has the exact same number of lines as the input.
 Do NOT add any extra text, explanations, or introductory phrases. Only provide the translated numbered list.
 
@@ -37,93 +135,531 @@ Example Output for 'Spanish':
 1. ¡Hola a todos!
 2. Bienvenidos a nuestro canal.
 """
-        user_prompt = f"Translate the text for each line in the following numbered list to {target_language}:\n\n{numbered_list}"
-        return system_prompt, user_prompt
+
+JOINED_SYSTEM_PROMPT = f"""You are a professional translator. Your task is to translate each text fragment into the target language named on the first line of the user message.
+The fragments follow that line and are separated by '{FRAGMENT_SEPARATOR}'. Return only the translated fragments in the same order, joined by the same separator.
+Do NOT translate, add or remove separators. Do NOT add any extra text, explanations, or introductory phrases.
+"""
+
+STRUCTURED_SYSTEM_PROMPT = """You are a professional translator. Your task is to translate the text for each numbered line into the target language named on the first line of the user message.
+Return one item per numbered line, where "i" is the line number and "t" is the translated text.
+"""
+
+SINGLE_TEXT_SYSTEM_PROMPT = """You are a professional translator. Translate the text that follows the first line of the user message into the target language named on that line.
+Only provide the translation.
+"""
+
+
+def _parse_numbered_line(line: str) -> Optional[Tuple[int, str]]:
+    """Splits a line such as "12. text" into (12, "text"), or returns None if it is not numbered."""
+    number, separator, text = line.strip().partition('.')
+    if not separator or not number.isdecimal():
+        return None
+    return int(number), text.strip()
+
+
+def _with_target_language(target_language: str, text: str) -> str:
+    """Builds the user message: the target language on the first line, then the text."""
+    return f"Target language: {target_language}\n\n{text}"
+
+
+@functools.lru_cache(maxsize=16)
+def _load_encoding(model: str) -> Optional["tiktoken.Encoding"]:
+    """Returns the tokenizer for the model, or None if it cannot be loaded (e.g. offline)."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Could not load a tokenizer for %s, estimating tokens from length: %s", model, e)
+        return None
+
+
+def _token_count(model: str, text: str) -> int:
+    """Counts the tokens of a text with the model's tokenizer, or estimates ~4 characters per token without one."""
+    encoding = _load_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+# Subtitle lines and sentences repeat, so their counts are cached; whole prompts are not.
+count_text_tokens = functools.lru_cache(maxsize=16384)(_token_count)
+
+
+def _estimate_tokens(model: str, messages: List[Dict[str, str]]) -> int:
+    """
+    Token estimate used to budget a request, counted with the same tokenizer as batch
+    sizing so CJK prompts are not under-charged.
+    """
+    return sum(_token_count(model, message["content"]) for message in messages) + PROMPT_TOKEN_OVERHEAD
+
+
+def provider_backoff(headers) -> Optional[float]:
+    """
+    Returns how long the provider asks us to wait, from Retry-After or an exhausted
+    x-ratelimit-remaining-requests header, or None if no wait is requested.
+    """
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    if headers.get("x-ratelimit-remaining-requests") == "0":
+        reset = headers.get("x-ratelimit-reset-requests", "")
+        seconds = sum(float(value) * _RESET_UNIT_SECONDS[unit] for value, unit in _RESET_DURATION_RE.findall(reset))
+        return seconds or None
+    return None
+
+class TranslationService:
+    """
+    A service to handle interactions with the OpenAI API for translation.
+    """
+    def __init__(self, api_key: str, model: str, rate_limiter: RateLimiter, base_url: Optional[str] = None,
+                 cache: Optional[Redis] = None, max_concurrency: Optional[int] = None):
+        if not api_key:
+            raise ValueError("API key is required.")
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,  # Disable internal retries
+            http_client=httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+        )
+        self.model = model
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        # Upper bound on concurrent requests to the model, independent of the rate budget.
+        self._inflight = asyncio.Semaphore(max_concurrency or settings.OPENAI_MAX_CONCURRENCY)
+        self._single_text_cache: LRUCache = LRUCache(maxsize=SINGLE_TEXT_CACHE_SIZE)
+        # Batch outcome counts not yet written to Redis, by (stats key, field).
+        self._batch_outcomes: Counter = Counter()
+        # The OpenAI API supports structured outputs; other compatible endpoints are
+        # assumed not to. It is switched off if the endpoint rejects the request.
+        self.structured_outputs = base_url is None
+
+    async def close(self):
+        """Closes the underlying HTTP client and its pooled connections."""
+        await self.client.close()
+
+    async def _send(self, messages: List[Dict[str, str]], **kwargs):
+        """
+        Sends one chat completion request within the rate budget, feeding the provider's
+        rate limit headers back into the limiter. The caller must hold self._inflight.
+        A 429 is retried after the provider's Retry-After, or else after a decorrelated
+        jitter backoff capped at RATE_LIMIT_BACKOFF_CAP.
+        """
+        delay = RATE_LIMIT_BACKOFF_BASE
+        tokens = _estimate_tokens(self.model, messages)
+        for retry in range(MAX_RATE_LIMIT_RETRIES + 1):
+            await self.rate_limiter.acquire_async(tokens)
+            try:
+                raw = await self.client.chat.completions.with_raw_response.create(
+                    model=self.model,
+                    messages=messages,
+                    **kwargs
+                )
+                break
+            except RateLimitError as e:
+                if retry == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                backoff = provider_backoff(e.response.headers)
+                if backoff:
+                    # The limiter holds every worker back until the provider's reset.
+                    await self.rate_limiter.pause_async(backoff)
+                    continue
+                delay = min(RATE_LIMIT_BACKOFF_CAP, random.uniform(RATE_LIMIT_BACKOFF_BASE, delay * 3))
+                logger.warning("Rate limited by the provider. Retrying in %.2fs (%s/%s).", delay, retry + 1, MAX_RATE_LIMIT_RETRIES)
+                await asyncio.sleep(delay)
+
+        backoff = provider_backoff(raw.headers)
+        if backoff:
+            await self.rate_limiter.pause_async(backoff)
+        return raw.parse()
+
+    async def _create_completion(self, messages: List[Dict[str, str]], **kwargs):
+        """
+        Sends one chat completion request within the concurrency and rate budgets.
+        """
+        async with self._inflight:
+            return await self._send(messages, **kwargs)
+
+    async def _stream_joined_completion(self, messages: List[Dict[str, str]], max_separators: int) -> Optional[str]:
+        """
+        Streams a joined-text completion and returns its content. Returns None as soon as the
+        output contains more separators than expected, closing the stream instead of waiting
+        for the rest of a response that is already unusable.
+        """
+        async with self._inflight:
+            stream = await self._send(messages, stream=True)
+            text = ""
+            separators = 0
+            scan_from = 0
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text += chunk.choices[0].delta.content or ""
+                # Only scan the new tail; a separator may straddle two chunks.
+                pos = text.find(FRAGMENT_SEPARATOR, scan_from)
+                while pos != -1:
+                    separators += 1
+                    scan_from = pos + len(FRAGMENT_SEPARATOR)
+                    pos = text.find(FRAGMENT_SEPARATOR, scan_from)
+                scan_from = max(scan_from, len(text) - len(FRAGMENT_SEPARATOR) + 1)
+
+                if separators > max_separators:
+                    await stream.close()
+                    logger.warning("Joined translation exceeded %s separators. Aborting stream.", max_separators)
+                    return None
+            return text
+
+    def _create_numbered_list_prompt(self, numbered_list: str, target_language: str) -> tuple[str, str]:
+        return NUMBERED_LIST_SYSTEM_PROMPT, _with_target_language(target_language, numbered_list)
+
+    def _create_joined_prompt(self, joined_text: str, target_language: str) -> tuple[str, str]:
+        return JOINED_SYSTEM_PROMPT, _with_target_language(target_language, joined_text)
+
+    async def _translate_joined(self, batch: List[Dict[str, Any]], target_language: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Translates a batch sent as a single separator-joined string.
+        Returns None if the response does not split back into the expected number of fragments.
+        """
+        joined_text = FRAGMENT_SEPARATOR.join(item['text'] for item in batch)
+        system_prompt, user_prompt = self._create_joined_prompt(joined_text, target_language)
+
+        logger.info("Attempting to translate a batch of %s translation units as joined text.", len(batch))
+        content = await self._stream_joined_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            max_separators=len(batch) - 1,
+        )
+        if content is None:
+            return None
+
+        # Validate with count() and only split once the shape is known to be right.
+        separator_count = content.count(FRAGMENT_SEPARATOR)
+        if separator_count != len(batch) - 1:
+            logger.warning(
+                f"Joined translation returned {separator_count + 1} fragments for {len(batch)} units. "
+                f"Falling back to numbered list."
+            )
+            return None
+
+        fragments = content.strip().split(FRAGMENT_SEPARATOR)
+
+        return [{**item, 'text': fragment.strip()} for item, fragment in zip(batch, fragments)]
 
     def _parse_numbered_list(self, text: str) -> List[str]:
-        # Split by lines, then strip numbering like "1. ", "12. ", etc.
-        lines = text.strip().split('\n')
-        # This regex handles numbers, dots, and optional spaces.
-        return [re.sub(r'^\d+\.\s*', '', line).strip() for line in lines]
+        # Split by lines, skipping blank ones, then strip numbering like "1. ", "12. ", etc.
+        return [_NUMBER_PREFIX_RE.sub('', line, count=1).strip() for line in text.splitlines() if line.strip()]
 
     def _get_numbered_text_map(self, text: str) -> Dict[int, str]:
         """Parses a numbered list string into a dictionary."""
         result_map = {}
-        lines = text.strip().split('\n')
-        for line in lines:
-            match = re.match(r'^(\d+)\.\s*(.*)', line.strip())
-            if match:
-                index = int(match.group(1))
-                content = match.group(2).strip()
-                result_map[index] = content
+        for line in text.splitlines():
+            parsed = _parse_numbered_line(line)
+            if parsed:
+                number, line_text = parsed
+                result_map[number] = line_text
         return result_map
 
-    def _translate_single_text(self, text: str, target_language: str) -> str:
+    async def _request_numbered_map(self, numbered_list: str, target_language: str) -> Dict[int, str]:
+        """
+        Sends a numbered list and returns the translations by line number, using a strict
+        JSON schema when the endpoint supports it and a plain numbered list otherwise.
+        """
+        if self.structured_outputs:
+            try:
+                response = await self._create_completion(
+                    [
+                        {"role": "system", "content": STRUCTURED_SYSTEM_PROMPT},
+                        {"role": "user", "content": _with_target_language(target_language, numbered_list)},
+                    ],
+                    response_format=STRUCTURED_RESPONSE_FORMAT,
+                )
+                items = orjson.loads(response.choices[0].message.content)["items"]
+                return {item["i"]: item["t"].strip() for item in items}
+            except BadRequestError as e:
+                logger.warning("Structured outputs are not supported by the endpoint, using plain numbered lists: %s", e)
+                self.structured_outputs = False
+
+        system_prompt, user_prompt = self._create_numbered_list_prompt(numbered_list, target_language)
+        response = await self._create_completion([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ])
+        return self._get_numbered_text_map(response.choices[0].message.content.strip())
+
+    async def _translate_single_text(self, text: str, target_language: str) -> str:
         """
         Translates a single line of text. Used as a fallback.
+        Lines too long for one request are translated in sentence groups and rejoined.
         """
-        self.rate_limiter.acquire()
-        logger.info(f"Translating single line to {target_language}: '{text[:30]}...'")
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": f"You are a professional translator. Translate the following text to {target_language}."},
-                {"role": "user", "content": text},
+        if count_text_tokens(self.model, text) > SINGLE_TEXT_TOKEN_LIMIT:
+            pieces = self._split_long_text(text)
+            if len(pieces) > 1:
+                logger.info("Line of %s characters split into %s pieces for translation.", len(text), len(pieces))
+                translated = await asyncio.gather(
+                    *(self._translate_text_request(piece, target_language) for piece in pieces)
+                )
+                return ' '.join(translated)
+        return await self._translate_text_request(text, target_language)
+
+    def _split_long_text(self, text: str) -> List[str]:
+        """Groups the sentences of a long line into pieces that each fit SINGLE_TEXT_TOKEN_LIMIT."""
+        pieces = []
+        current = []
+        current_tokens = 0
+        for sentence in _SENTENCE_BOUNDARY_RE.split(text):
+            sentence_tokens = count_text_tokens(self.model, sentence)
+            if current and current_tokens + sentence_tokens > SINGLE_TEXT_TOKEN_LIMIT:
+                pieces.append(' '.join(current))
+                current = []
+                current_tokens = 0
+            current.append(sentence)
+            current_tokens += sentence_tokens
+        if current:
+            pieces.append(' '.join(current))
+        return pieces
+
+    async def _translate_text_request(self, text: str, target_language: str) -> str:
+        """Sends one single-text translation request, unless the text was translated before."""
+        key = (text, target_language)
+        cached = self._single_text_cache.get(key)
+        if cached is not None:
+            return cached
+
+        logger.info("Translating single line to %s: '%s...'", target_language, text[:30])
+        response = await self._create_completion(
+            [
+                {"role": "system", "content": SINGLE_TEXT_SYSTEM_PROMPT},
+                {"role": "user", "content": _with_target_language(target_language, text)},
             ],
             temperature=0.3,
         )
-        return response.choices[0].message.content.strip()
+        translated = response.choices[0].message.content.strip()
+        self._single_text_cache[key] = translated
+        return translated
+
+    def _budget_ranges(self, batch: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """
+        Cuts the batch into consecutive ranges whose estimated prompts fit the model
+        context budget, filling each range as far as it goes so that an oversized
+        batch costs as few requests as possible.
+        """
+        ranges = []
+        start, tokens = 0, BATCH_PROMPT_TOKEN_OVERHEAD
+        for i, item in enumerate(batch):
+            line_tokens = count_text_tokens(self.model, item['text']) + BATCH_LINE_TOKEN_OVERHEAD
+            if i > start and tokens + line_tokens > MODEL_CONTEXT_BUDGET:
+                ranges.append((start, i))
+                start, tokens = i, BATCH_PROMPT_TOKEN_OVERHEAD
+            tokens += line_tokens
+        ranges.append((start, len(batch)))
+        if len(ranges) > 1:
+            logger.info("Batch of %s exceeds the context budget. Splitting into %s requests.", len(batch), len(ranges))
+        return ranges
+
+    def _record_batch_outcome(self, target_language: str, batch_size: int, success: bool):
+        """
+        Counts whether a whole-batch request came back well-formed, under its size bucket.
+        The count is buffered until flush_batch_stats(), so no Redis call is made on the event loop.
+        """
+        if self.cache is None or batch_size < BATCH_SIZE_BUCKETS[0]:
+            return
+        bucket = max(b for b in BATCH_SIZE_BUCKETS if b <= batch_size)
+        key = f"{BATCH_STATS_PREFIX}{target_language}"
+        self._batch_outcomes[key, f"{bucket}:attempts"] += 1
+        if success:
+            self._batch_outcomes[key, f"{bucket}:successes"] += 1
+
+    def flush_batch_stats(self):
+        """Writes the buffered batch outcome counts to Redis in one round trip."""
+        if self.cache is None or not self._batch_outcomes:
+            return
+        outcomes, self._batch_outcomes = self._batch_outcomes, Counter()
+        pipe = self.cache.pipeline(transaction=False)
+        for (key, field), count in outcomes.items():
+            pipe.hincrby(key, field, count)
+        pipe.execute()
+
+    def suggest_batch_size(self, target_language: str) -> int:
+        """
+        Suggests a batch size for the language: the largest bucket with enough samples and a
+        high success rate; otherwise the default, or the largest smaller bucket not yet shown
+        to fail if the default itself is unreliable.
+        """
+        if self.cache is None:
+            return DEFAULT_BATCH_SIZE
+        stats = self.cache.hgetall(f"{BATCH_STATS_PREFIX}{target_language}")
+
+        unreliable = set()
+        for bucket in reversed(BATCH_SIZE_BUCKETS):
+            attempts = int(stats.get(f"{bucket}:attempts".encode(), 0))
+            successes = int(stats.get(f"{bucket}:successes".encode(), 0))
+            if attempts >= BATCH_STATS_MIN_SAMPLES:
+                if successes / attempts > BATCH_STATS_MIN_SUCCESS_RATE:
+                    return bucket
+                unreliable.add(bucket)
+
+        if DEFAULT_BATCH_SIZE not in unreliable:
+            return DEFAULT_BATCH_SIZE
+        smaller = [b for b in BATCH_SIZE_BUCKETS if b < DEFAULT_BATCH_SIZE and b not in unreliable]
+        return max(smaller) if smaller else BATCH_SIZE_BUCKETS[0]
+
+    def _cache_key(self, text: str, target_language: str) -> str:
+        return f"{TRANSLATION_CACHE_PREFIX}{self.model}:{target_language}:{_text_digest(text)}"
+
+    async def translate_batch_multi(self, batch: List[Dict[str, Any]], target_languages: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Translates the same batch into several languages concurrently. The languages share
+        this service's rate limiter, in-flight semaphore and HTTP connection pool.
+        """
+        async with asyncio.TaskGroup() as group:
+            tasks = {
+                language: group.create_task(self.translate_batch(batch, language))
+                for language in target_languages
+            }
+        return {language: task.result() for language, task in tasks.items()}
+
+    async def translate_batch(self, batch: List[Dict[str, Any]], target_language: str, max_retries: int = 2) -> List[Dict[str, Any]]:
+        """
+        Translates a batch of subtitle dicts. Lines that need no translation are kept
+        as they are, and each distinct remaining text is translated once and copied to
+        every item that repeats it.
+        """
+        unique_items: Dict[str, Dict[str, Any]] = {}
+        for item in batch:
+            if not _is_passthrough(item['text']):
+                unique_items.setdefault(item['text'], item)
+        if not unique_items:
+            return [{**item} for item in batch]
+        if len(unique_items) == len(batch):
+            return await self._translate_cached(batch, target_language, max_retries)
+
+        logger.info("Batch of %s has %s distinct texts to translate.", len(batch), len(unique_items))
+        translated = await self._translate_cached(list(unique_items.values()), target_language, max_retries)
+        translations = {source_text: new_item['text'] for source_text, new_item in zip(unique_items, translated)}
+
+        return [{**item, 'text': translations.get(item['text'], item['text'])} for item in batch]
+
+    async def _translate_cached(self, batch: List[Dict[str, Any]], target_language: str, max_retries: int = 2) -> List[Dict[str, Any]]:
+        """
+        Translates a batch of subtitle dicts, serving lines from the translation cache
+        and sending only the misses to the model.
+        """
+        if not batch or self.cache is None:
+            return await self._translate_uncached(batch, target_language, max_retries)
+
+        keys = [self._cache_key(item['text'], target_language) for item in batch]
+        # Redis calls run in a worker thread so concurrent batches on the loop are not held up.
+        cached = await asyncio.to_thread(self.cache.mget, keys)
+
+        result: List[Optional[Dict[str, Any]]] = [None] * len(batch)
+        miss_positions = []
+        for i, (item, value) in enumerate(zip(batch, cached)):
+            if value is None:
+                miss_positions.append(i)
+            else:
+                result[i] = {**item, 'text': value.decode("utf-8")}
 
-    def translate_batch(self, batch: List[Dict[str, Any]], target_language: str, max_retries: int = 2) -> List[Dict[str, Any]]:
+        logger.info("Translation cache: %s hits, %s misses.", len(batch) - len(miss_positions), len(miss_positions))
+        if miss_positions:
+            translated = await self._translate_uncached([batch[i] for i in miss_positions], target_language, max_retries)
+            pipe = self.cache.pipeline(transaction=False)
+            for i, new_item in zip(miss_positions, translated):
+                result[i] = new_item
+                # Placeholders for failed lines must not be cached.
+                if not new_item['text'].startswith(("[Translation Error:", "[Translation Missing]")):
+                    pipe.set(keys[i], new_item['text'], ex=TRANSLATION_CACHE_TTL_SECONDS)
+            await asyncio.to_thread(pipe.execute)
+
+        return result
+
+    async def _translate_uncached(self, batch: List[Dict[str, Any]], target_language: str, max_retries: int = 2) -> List[Dict[str, Any]]:
+        """
+        Translates a batch of subtitle dicts using a hierarchical fallback strategy.
+        The batch is first cut into ranges that fit the model context budget. Ranges
+        that fail as a whole are halved and queued again; every range of one level is
+        sent concurrently.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(batch)
+        pending = deque(self._budget_ranges(batch) if batch else [])
+        while pending:
+            ranges = list(pending)
+            pending.clear()
+            outcomes = await asyncio.gather(
+                *(self._translate_range(batch[lo:hi], target_language, max_retries) for lo, hi in ranges)
+            )
+            for (lo, hi), translated in zip(ranges, outcomes):
+                if translated is None:
+                    mid_point = (lo + hi) // 2
+                    pending.append((lo, mid_point))
+                    pending.append((mid_point, hi))
+                else:
+                    results[lo:hi] = translated
+        return results
+
+    async def _translate_range(self, batch: List[Dict[str, Any]], target_language: str, max_retries: int = 2) -> Optional[List[Dict[str, Any]]]:
         """
-        Translates a batch of subtitle dicts using a recursive, hierarchical fallback strategy.
+        Translates a batch in one request, repairing missing lines individually.
+        Returns None if the batch should be split and retried in halves.
         """
         expected_count = len(batch)
-        if expected_count == 0:
-            return []
 
         if expected_count < MIN_BATCH_SIZE_FOR_RECURSION:
-            return self._fallback_to_single_items(batch, target_language)
+            return await self._fallback_to_single_items(batch, target_language)
+
+        # Try the compact separator-joined format first; it costs the fewest tokens.
+        try:
+            translated_batch = await self._translate_joined(batch, target_language)
+            if translated_batch is not None:
+                logger.info("Successfully translated batch of %s as joined text.", expected_count)
+                self._record_batch_outcome(target_language, expected_count, True)
+                return translated_batch
+        except Exception as e:
+            logger.error("Joined translation failed for batch of %s, using numbered list: %s", expected_count, e, exc_info=True)
 
         # Format the batch into a numbered list string
-        numbered_list = "\n".join([f"{i+1}. {item['text']}" for i, item in enumerate(batch)])
-        system_prompt, user_prompt = self._create_numbered_list_prompt(numbered_list, target_language)
+        numbered_list = "\n".join(f"{i}. {item['text']}" for i, item in enumerate(batch, 1))
         
         attempt = 0
         while attempt < max_retries:
             try:
-                self.rate_limiter.acquire()
-                logger.info(f"Attempting to translate a batch of {expected_count} translation units. Attempt {attempt + 1}/{max_retries}")
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ]
-                )
-                
-                translated_text = response.choices[0].message.content.strip()
+                logger.info("Attempting to translate a batch of %s translation units. Attempt %s/%s", expected_count, attempt + 1, max_retries)
                 
                 # --- Surgical Retry Logic ---
                 # This logic is more robust than just comparing counts.
-                translated_map = self._get_numbered_text_map(translated_text)
+                translated_map = await self._request_numbered_map(numbered_list, target_language)
                 
-                if len(translated_map) == expected_count:
-                    logger.info(f"Successfully translated batch of {expected_count} with correct format.")
-                    reconstructed_batch = []
-                    for i, item in enumerate(batch):
-                        new_item = item.copy()
-                        # Use the map to ensure we get the right text even if order is scrambled
-                        new_item['text'] = translated_map.get(i + 1, "[Translation Missing]")
-                        reconstructed_batch.append(new_item)
+                # Only the line numbers round-trip through the model; every other field
+                # of an item is reattached locally, so the response is complete only if
+                # each number 1..N came back.
+                if all(i + 1 in translated_map for i in range(expected_count)):
+                    logger.info("Successfully translated batch of %s with correct format.", expected_count)
+                    # Use the map to ensure we get the right text even if order is scrambled
+                    reconstructed_batch = [{**item, 'text': translated_map[i]} for i, item in enumerate(batch, 1)]
+                    self._record_batch_outcome(target_language, expected_count, True)
                     return reconstructed_batch
                 
-                # If count mismatches, try to repair it.
+                # If some numbers are missing, try to repair it.
                 logger.warning(
                     f"Count mismatch in batch of {expected_count}. "
                     f"Expected {expected_count}, got {len(translated_map)}. Attempting surgical retry."
                 )
                 
+                missing = [i for i in range(expected_count) if i + 1 not in translated_map]
+                for i in missing:
+                    logger.warning("Item %s was missing from LLM response. Translating it individually.", i + 1)
+                retried = await asyncio.gather(
+                    *(self._translate_single_text(batch[i]['text'], target_language) for i in missing),
+                    return_exceptions=True,
+                )
+                retried_map = dict(zip(missing, retried))
+
                 repaired_batch = []
                 for i, item in enumerate(batch):
                     new_item = item.copy()
@@ -131,45 +667,41 @@ Example Output for 'Spanish':
 
                     if original_text_number in translated_map:
                         new_item['text'] = translated_map[original_text_number]
+                    elif isinstance(retried_map[i], Exception):
+                        logger.error("Surgical retry for item %s failed: %s", original_text_number, retried_map[i])
+                        new_item['text'] = f"[Translation Error: {item['text']}]"
                     else:
-                        logger.warning(f"Item {original_text_number} was missing from LLM response. Translating it individually.")
-                        try:
-                            new_item['text'] = self._translate_single_text(item['text'], target_language)
-                        except Exception as e:
-                            logger.error(f"Surgical retry for item {original_text_number} failed: {e}")
-                            new_item['text'] = f"[Translation Error: {item['text']}]"
+                        new_item['text'] = retried_map[i]
                     
                     repaired_batch.append(new_item)
                 
-                logger.info(f"Successfully repaired batch of {expected_count} via surgical retry.")
+                logger.info("Successfully repaired batch of %s via surgical retry.", expected_count)
+                self._record_batch_outcome(target_language, expected_count, False)
                 return repaired_batch
                 # --- End Surgical Retry ---
 
             except Exception as e:
-                logger.error(f"Unexpected error on batch of {expected_count}, will trigger fallback: {e}", exc_info=True)
+                logger.error("Unexpected error on batch of %s, will trigger fallback: %s", expected_count, e, exc_info=True)
                 attempt += 1 # Incrementing here means we won't retry on parsing/validation errors, but go to fallback.
         
         # This fallback is now a secondary safety net.
-        logger.warning(f"Batch of {expected_count} failed even surgical retry. Falling back to splitting.")
-        mid_point = expected_count // 2
-        
-        first_half_translated = self.translate_batch(batch[:mid_point], target_language)
-        second_half_translated = self.translate_batch(batch[mid_point:], target_language)
-        
-        return first_half_translated + second_half_translated
+        logger.warning("Batch of %s failed even surgical retry. Falling back to splitting.", expected_count)
+        self._record_batch_outcome(target_language, expected_count, False)
+        return None
 
-    def _fallback_to_single_items(self, batch: List[Dict[str, Any]], target_language: str) -> List[Dict[str, Any]]:
-        logger.warning(f"Falling back to single-item translation for a batch of {len(batch)} translation units.")
+    async def _fallback_to_single_items(self, batch: List[Dict[str, Any]], target_language: str) -> List[Dict[str, Any]]:
+        logger.warning("Falling back to single-item translation for a batch of %s translation units.", len(batch))
+        results = await asyncio.gather(
+            *(self._translate_single_text(item['text'], target_language) for item in batch),
+            return_exceptions=True,
+        )
         translated_items = []
-        for item in batch:
-            try:
-                translated_text = self._translate_single_text(item['text'], target_language)
-                new_item = item.copy()
-                new_item['text'] = translated_text
-                translated_items.append(new_item)
-            except Exception as e:
-                logger.error(f"Failed to translate single item '{item.get('text', '')[:30]}...' during fallback: {e}", exc_info=True)
-                error_item = item.copy()
-                error_item['text'] = f"[Translation Error: {item.get('text', '')}]"
-                translated_items.append(error_item)
-        return translated_items 
\ No newline at end of file
+        for item, result in zip(batch, results):
+            new_item = item.copy()
+            if isinstance(result, Exception):
+                logger.error("Failed to translate single item '%s...' during fallback: %s", item.get('text', '')[:30], result, exc_info=result)
+                new_item['text'] = f"[Translation Error: {item.get('text', '')}]"
+            else:
+                new_item['text'] = result
+            translated_items.append(new_item)
+        return translated_items
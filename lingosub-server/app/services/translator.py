@@ -1,20 +1,33 @@
-import re
+import asyncio
+import functools
+import random
+from collections import deque
 from pathlib import Path
-from typing import List, NamedTuple, Callable, Optional
+from typing import Deque, Dict, Iterable, List, NamedTuple, Callable, Optional, Tuple
 import logging
 
-from openai import OpenAI
+from openai import AsyncOpenAI, RateLimitError
 from app.core.config import settings
+from app.services.rate_limiter import RateLimiter
+from app.services.translation_service import (
+    MAX_RATE_LIMIT_RETRIES,
+    PROMPT_TOKEN_OVERHEAD,
+    RATE_LIMIT_BACKOFF_BASE,
+    RATE_LIMIT_BACKOFF_CAP,
+    count_text_tokens,
+    provider_backoff,
+)
 
 logger = logging.getLogger(__name__)
 
 # --- Constants ---
 # A separator that is unlikely to appear in subtitle text
 BATCH_SEPARATOR = "|||---|||"
-# A rough estimate of tokens per character for batching
-TOKENS_PER_CHAR = 0.5
-# Max tokens for a single batch to avoid overwhelming the API
+# Starting token budget for a single batch to avoid overwhelming the API
 MAX_TOKENS_PER_BATCH = 3000
+# Bounds for the adaptive batch budget
+MIN_TOKENS_PER_BATCH = 500
+MAX_ADAPTIVE_TOKENS_PER_BATCH = 12000
 
 SYSTEM_PROMPT = """You are an expert subtitle translator. Your task is to translate the given text fragments from a source language into {target_language}.
 
@@ -27,8 +40,71 @@ SYSTEM_PROMPT = """You are an expert subtitle translator. Your task is to transl
 - The number of fragments you return must exactly match the number of fragments you receive.
 """
 
+@functools.lru_cache(maxsize=32)
+def _system_prompt(target_language: str) -> str:
+    """The system prompt for a language, built once so every batch of a file sends the same prefix."""
+    return SYSTEM_PROMPT.format(target_language=target_language)
+
+
+class AdaptiveBatcher:
+    """
+    Tracks the token budget for translation batches.
+    The budget grows after every successful batch and is halved after a failed one,
+    and the size of the last failing batch becomes the new ceiling, so it settles on
+    the largest batch the model reliably returns intact.
+    """
+    def __init__(
+        self,
+        current_budget: float = MAX_TOKENS_PER_BATCH,
+        min_budget: float = MIN_TOKENS_PER_BATCH,
+        max_budget: float = MAX_ADAPTIVE_TOKENS_PER_BATCH,
+        growth: float = 1.25,
+        shrink: float = 0.5,
+    ):
+        self.current_budget = current_budget
+        self.min = min_budget
+        self.max = max_budget
+        self.growth = growth
+        self.shrink = shrink
+
+    def on_success(self):
+        self.current_budget = min(self.max, self.current_budget * self.growth)
+
+    def on_failure(self, batch_tokens: float):
+        self.max = max(self.min, min(self.max, batch_tokens))
+        # Batches that were already in flight at the old budget should not halve it again
+        self.current_budget = max(self.min, min(self.current_budget, batch_tokens * self.shrink))
+
+
+# One batcher per model, kept across files so later files start from what was learned
+_batchers: Dict[str, AdaptiveBatcher] = {}
+
+
+def _get_batcher(model: str) -> AdaptiveBatcher:
+    if model not in _batchers:
+        _batchers[model] = AdaptiveBatcher()
+    return _batchers[model]
+
+
+def _max_in_flight(tokens_per_request: float) -> int:
+    """
+    Number of batches to keep in flight: no more than the provider accepts per second
+    (requests per minute) or than its token budget pays for per minute, and never more
+    than OPENAI_MAX_CONCURRENCY.
+    """
+    rpm_bound = settings.OPENAI_REQUESTS_PER_MINUTE // 60
+    # The completion is about as long as the prompt, so a request costs twice its input
+    tpm_bound = int(settings.OPENAI_TOKENS_PER_MINUTE // (tokens_per_request * 2))
+    max_in_flight = max(1, min(settings.OPENAI_MAX_CONCURRENCY, rpm_bound, tpm_bound))
+    if max_in_flight < settings.OPENAI_MAX_CONCURRENCY:
+        limit = "OPENAI_REQUESTS_PER_MINUTE" if rpm_bound <= tpm_bound else "OPENAI_TOKENS_PER_MINUTE"
+        logger.warning(f"{limit} limits translation to {max_in_flight} concurrent batches.")
+    return max_in_flight
+
+
 class SubtitleBlock(NamedTuple):
     index: int
+    # Timestamps are kept exactly as written in the SRT file, e.g. "00:01:02,500"
     start_time: str
     end_time: str
     text: str
@@ -37,82 +113,84 @@ class SubtitleBlock(NamedTuple):
 def parse_srt(content: str) -> List[SubtitleBlock]:
     """Parses SRT content into a list of SubtitleBlock objects."""
     logger.info("Parsing SRT content.")
-    content = content.replace('\r\n', '\n').strip()
+    content = content.replace('\r\n', '\n').lstrip('\ufeff').strip()
     blocks = []
-    # A more robust regex to handle various line endings and optional trailing newlines
-    for match in re.finditer(
-        r'(\d+)\n([\d:,]+)\s-->\s([\d:,]+)\n([\s\S]+?)(?=\n\n\d+|\Z)',
-        content
-    ):
-        blocks.append(SubtitleBlock(
-            index=int(match.group(1)),
-            start_time=match.group(2).replace(',', '.'),
-            end_time=match.group(3).replace(',', '.'),
-            text=match.group(4).strip()
-        ))
+    # Blocks are separated by blank lines. A chunk that does not open with an index line
+    # and a timing line is a blank line inside the previous block's text.
+    for raw in content.split('\n\n'):
+        lines = raw.strip().split('\n', 2)
+        if len(lines) >= 2 and lines[0].rstrip().isdecimal() and '-->' in lines[1]:
+            start_time, _, end_time = lines[1].partition('-->')
+            text = lines[2].strip() if len(lines) == 3 else ''
+            if text:
+                blocks.append(SubtitleBlock(
+                    index=int(lines[0]),
+                    start_time=start_time.strip(),
+                    end_time=end_time.strip(),
+                    text=text
+                ))
+        elif blocks and raw.strip():
+            blocks[-1] = blocks[-1]._replace(text=f"{blocks[-1].text}\n\n{raw.strip()}")
     logger.info(f"Parsed {len(blocks)} subtitle blocks.")
     return blocks
 
 
-def build_srt(blocks: List[SubtitleBlock]) -> str:
-    """Builds an SRT content string from a list of SubtitleBlock objects."""
-    logger.info(f"Building SRT from {len(blocks)} blocks.")
-    srt_content = []
-    for block in blocks:
-        start_time = block.start_time.replace('.', ',')
-        end_time = block.end_time.replace('.', ',')
-        srt_content.append(
-            f"{block.index}\n{start_time} --> {end_time}\n{block.text}\n"
-        )
-    logger.info("SRT content built successfully.")
-    return ''.join(srt_content)
+def write_srt(blocks: Iterable[SubtitleBlock], path: Path) -> None:
+    """Writes SubtitleBlock objects to an SRT file one block at a time, without building the whole file in memory."""
+    logger.info(f"Writing SRT to {path}.")
+    count = 0
+    with open(path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        for block in blocks:
+            # Blocks are separated by a blank line, as SRT requires
+            if count:
+                f.write("\n")
+            f.write(f"{block.index}\n{block.start_time} --> {block.end_time}\n{block.text}\n")
+            count += 1
+    logger.info(f"Wrote {count} SRT blocks.")
 
 
-def _translate_batch(texts: List[str], target_language: str, model: str, client: OpenAI) -> List[str]:
+async def _translate_batch(texts: List[str], target_language: str, model: str, client: AsyncOpenAI) -> List[str]:
     """Translates a batch of texts using the LLM."""
     if not texts:
         return []
 
     concatenated_text = BATCH_SEPARATOR.join(texts)
-    
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT.format(target_language=target_language)},
-                {"role": "user", "content": concatenated_text},
-            ],
-            temperature=0.2, # Lower temperature for more deterministic translation
+
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": _system_prompt(target_language)},
+            {"role": "user", "content": concatenated_text},
+        ],
+        temperature=0.2, # Lower temperature for more deterministic translation
+    )
+
+    translated_text = response.choices[0].message.content
+    if not translated_text:
+        raise ValueError("LLM returned an empty response.")
+
+    translated_fragments = translated_text.split(BATCH_SEPARATOR)
+
+    if len(translated_fragments) != len(texts):
+        raise ValueError(
+            f"Translation fragment count mismatch. Expected {len(texts)}, got {len(translated_fragments)}."
         )
-        
-        translated_text = response.choices[0].message.content
-        if not translated_text:
-            raise ValueError("LLM returned an empty response.")
-            
-        translated_fragments = translated_text.split(BATCH_SEPARATOR)
-
-        if len(translated_fragments) != len(texts):
-             raise ValueError(
-                f"Translation fragment count mismatch. Expected {len(texts)}, got {len(translated_fragments)}."
-            )
-            
-        return [fragment.strip() for fragment in translated_fragments]
-
-    except Exception as e:
-        logger.error(f"An error occurred during translation: {e}")
-        # In case of any error, return original texts as a fallback
-        return texts
-
-
-def translate_file(
+
+    return [fragment.strip() for fragment in translated_fragments]
+
+
+async def translate_file(
     source_path: Path, 
     target_language: str, 
     model: str, 
-    update_callback: Optional[Callable[[float], None]] = None
+    update_callback: Optional[Callable[[float], None]] = None,
+    rate_limiter: Optional[RateLimiter] = None,
 ) -> Path:
     """
     Reads an SRT file, translates its content using an LLM, and saves it to a new file,
     providing progress updates along the way.
+    Batches are sent concurrently, as many at a time as the provider's request and token limits allow.
+    If a rate limiter is given, each batch first takes a permit and its estimated tokens from it.
     """
     def _update_progress(progress: float):
         if update_callback:
@@ -121,9 +199,11 @@ def translate_file(
     _update_progress(0.0)
     logger.info(f"Starting translation for {source_path.name} to {target_language} using {model}")
     
-    client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+    # Rate limits are retried by the workers below, so the client must not retry them itself
+    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0)
 
-    source_content = source_path.read_text(encoding='utf-8')
+    # Decoded in one step from the raw bytes; utf-8-sig drops a BOM if the file has one
+    source_content = source_path.read_bytes().decode('utf-8-sig')
     subtitle_blocks = parse_srt(source_content)
     
     if not subtitle_blocks:
@@ -131,51 +211,120 @@ def translate_file(
 
     _update_progress(0.1) # Progress after parsing
 
-    all_texts = [block.text for block in subtitle_blocks]
-    translated_texts = []
-    
-    # Simple batching logic based on token count
-    current_batch = []
-    current_token_count = 0
+    # Repeated lines are translated once and copied back to every block that has them
+    all_texts = list(dict.fromkeys(block.text for block in subtitle_blocks))
     total_texts = len(all_texts)
+    if total_texts < len(subtitle_blocks):
+        logger.info(f"{len(subtitle_blocks)} subtitle blocks have {total_texts} distinct texts to translate.")
+    # Counted with the model's tokenizer, so CJK lines are not under-counted
+    token_counts = [count_text_tokens(model, text) for text in all_texts]
+    translated_texts: List[Optional[str]] = [None] * total_texts
+
+    # Batches are cut from the pending spans only when they are sent, so that each one
+    # uses the batch budget as it stands after the batches that finished before it.
+    batcher = _get_batcher(model)
+    pending: Deque[Tuple[int, int]] = deque([(0, total_texts)])
+    completed_texts = 0
+    # Rate-limited retries so far, by the start of the span that was rate limited
+    rate_limited: Dict[int, int] = {}
+    # Batches taken but not yet finished. A failed or rate-limited batch goes back to
+    # pending, so workers wait for these instead of exiting on an empty queue.
+    in_flight = 0
+    work_changed = asyncio.Event()
 
-    for i, text in enumerate(all_texts):
-        text_token_count = len(text) * TOKENS_PER_CHAR
-        if current_token_count + text_token_count > MAX_TOKENS_PER_BATCH:
-            translated_batch = _translate_batch(current_batch, target_language, model, client)
-            translated_texts.extend(translated_batch)
-            current_batch = [text]
-            current_token_count = text_token_count
-        else:
-            current_batch.append(text)
-            current_token_count += text_token_count
-        
-        # Update progress after processing each text
-        progress = 0.1 + ( (i + 1) / total_texts * 0.8 ) # Translation is 80% of the work
-        _update_progress(progress)
-
-
-    # Translate the last remaining batch
-    if current_batch:
-        translated_batch = _translate_batch(current_batch, target_language, model, client)
-        translated_texts.extend(translated_batch)
+    def _next_batch() -> Tuple[int, int, float]:
+        start, end = pending.popleft()
+        stop, batch_tokens = start, 0.0
+        while stop < end and (stop == start or batch_tokens + token_counts[stop] <= batcher.current_budget):
+            batch_tokens += token_counts[stop]
+            stop += 1
+        if stop < end:
+            pending.appendleft((stop, end))
+        return start, stop, batch_tokens
+
+    async def _worker():
+        nonlocal in_flight
+        while True:
+            if not pending:
+                if not in_flight:
+                    return
+                # Another worker may still put spans back; wait until one finishes.
+                work_changed.clear()
+                await work_changed.wait()
+                continue
+            start, stop, batch_tokens = _next_batch()
+            in_flight += 1
+            try:
+                await _translate_span(start, stop, batch_tokens)
+            finally:
+                in_flight -= 1
+                work_changed.set()
+
+    async def _translate_span(start: int, stop: int, batch_tokens: float):
+        nonlocal completed_texts
+        batch = all_texts[start:stop]
+        try:
+            if rate_limiter is not None:
+                await rate_limiter.acquire_async(int(batch_tokens) + PROMPT_TOKEN_OVERHEAD)
+            translated_batch = await _translate_batch(batch, target_language, model, client)
+            batcher.on_success()
+        except RateLimitError as e:
+            # A rate limit says nothing about the batch size, so the budget is left alone
+            attempt = rate_limited.get(start, 0)
+            if attempt < MAX_RATE_LIMIT_RETRIES:
+                rate_limited[start] = attempt + 1
+                delay = provider_backoff(e.response.headers) or min(
+                    RATE_LIMIT_BACKOFF_CAP,
+                    RATE_LIMIT_BACKOFF_BASE * 2 ** attempt + random.uniform(0, RATE_LIMIT_BACKOFF_BASE),
+                )
+                logger.warning(f"Rate limited by the provider. Retrying batch in {delay:.2f}s ({attempt + 1}/{MAX_RATE_LIMIT_RETRIES}).")
+                await asyncio.sleep(delay)
+                # Retried spans go to the front of the queue
+                pending.appendleft((start, stop))
+                return
+            logger.error(f"Batch of {len(batch)} texts is still rate limited after {MAX_RATE_LIMIT_RETRIES} retries: {e}")
+            translated_batch = batch
+        except Exception as e:
+            batcher.on_failure(batch_tokens)
+            if len(batch) > 1:
+                logger.warning(
+                    f"Batch of {len(batch)} texts failed ({e}). "
+                    f"Retrying in halves with a budget of {batcher.current_budget:.0f} tokens."
+                )
+                mid = start + len(batch) // 2
+                pending.appendleft((mid, stop))
+                pending.appendleft((start, mid))
+                return
+            logger.error(f"An error occurred during translation: {e}")
+            # A single text that cannot be translated keeps its original text as a fallback
+            translated_batch = batch
+
+        translated_texts[start:stop] = translated_batch
+        # Update progress as batches finish, in whatever order they complete
+        completed_texts += len(batch)
+        _update_progress(0.1 + completed_texts / total_texts * 0.8) # Translation is 80% of the work
+
+    try:
+        workers = _max_in_flight(min(batcher.current_budget, sum(token_counts)) + PROMPT_TOKEN_OVERHEAD)
+        await asyncio.gather(*[_worker() for _ in range(workers)])
+    finally:
+        await client.close()
 
     if len(translated_texts) != total_texts:
         raise ValueError("Mismatch in translated text count after batching.")
 
-    translated_blocks = [
-        block._replace(text=translated_texts[i]) for i, block in enumerate(subtitle_blocks)
-    ]
+    translations = dict(zip(all_texts, translated_texts))
+    translated_blocks = (
+        block._replace(text=translations[block.text]) for block in subtitle_blocks
+    )
 
-    translated_srt_content = build_srt(translated_blocks)
-    _update_progress(0.95) # Progress after building SRT
-    
     result_dir = Path(settings.RESULT_FILE_DIR)
     result_dir.mkdir(exist_ok=True)
     result_path = result_dir / f"translated_{source_path.stem}.srt"
-    
-    result_path.write_text(translated_srt_content, encoding='utf-8')
-    
+
+    write_srt(translated_blocks, result_path)
+    _update_progress(0.95) # Progress after writing SRT
+
     logger.info(f"Translation finished. Result saved to {result_path}")
     _update_progress(1.0) # Final progress
     
@@ -1,4 +1,9 @@
+import asyncio
+import threading
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+from kombu.serialization import register
+import orjson
 from app.core.config import settings
 import logging
 
@@ -14,8 +19,55 @@ celery_app = Celery(
 
 logger.info("Celery app initialized.")
 
+# orjson encodes task messages and result meta in C and produces compact bytes.
+register(
+    "orjson",
+    orjson.dumps,
+    orjson.loads,
+    content_type="application/x-orjson",
+    content_encoding="utf-8",
+)
+
 # Optional configuration
 celery_app.conf.update(
     task_track_started=True,
+    task_serializer="orjson",
+    result_serializer="orjson",
+    accept_content=["orjson", "json"],
+    broker_pool_limit=settings.REDIS_MAX_CONNECTIONS,
+    broker_transport_options={"max_connections": settings.REDIS_MAX_CONNECTIONS, "socket_keepalive": True},
 )
-logger.info("Celery app configuration updated.")
\ No newline at end of file
+logger.info("Celery app configuration updated.")
+
+
+# Each worker process (and each thread of a threaded pool) keeps one event loop for all of
+# its tasks, instead of creating and tearing one down per task with asyncio.run().
+_worker_loops = threading.local()
+
+
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    """Returns this worker thread's persistent event loop, creating it on first use."""
+    loop = getattr(_worker_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _worker_loops.loop = loop
+    return loop
+
+
+def run_in_worker_loop(coro):
+    """Runs a coroutine to completion on the worker's persistent event loop."""
+    return get_worker_loop().run_until_complete(coro)
+
+
+@worker_process_init.connect
+def _init_worker_loop(**kwargs):
+    get_worker_loop()
+    logger.info("Worker event loop initialized.")
+
+
+@worker_process_shutdown.connect
+def _close_worker_loop(**kwargs):
+    loop = getattr(_worker_loops, "loop", None)
+    if loop is not None and not loop.is_closed():
+        loop.close()
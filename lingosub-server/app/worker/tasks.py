@@ -1,10 +1,20 @@
+import asyncio
 import logging
+import gzip
+import hashlib
+import secrets
+import shutil
+import threading
+import time
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
 import uuid
-from celery import Task
+from cachetools import TTLCache
+from celery import Task, states
+from celery.signals import worker_process_init
 import redis
 
-from app.worker.celery_app import celery_app
+from app.worker.celery_app import celery_app, run_in_worker_loop
 from app.core.config import settings
 from app.services.srt_processor import SRTProcessor
 from app.services.translation_service import TranslationService
@@ -14,92 +24,261 @@ logger = logging.getLogger(__name__)
 
 # Initialize a global Redis client for the worker
 # This helps in reusing the connection across tasks if the worker process is the same.
+# The pool is bounded: when every connection is busy, callers wait for one instead of
+# opening more and running into the server's client limit.
 try:
-    redis_client = redis.from_url(settings.CELERY_BROKER_URL)
+    redis_client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+        settings.CELERY_BROKER_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=5,
+        socket_keepalive=True,
+        health_check_interval=30,
+    ))
     logger.info("Successfully connected to Redis for Rate Limiter.")
 except Exception as e:
-    logger.error(f"Failed to connect to Redis for Rate Limiter: {e}", exc_info=True)
+    logger.error("Failed to connect to Redis for Rate Limiter: %s", e, exc_info=True)
     redis_client = None
 
-@celery_app.task(bind=True)
-def translate_srt_task(self: Task, source_file_path: str, target_language: str, model: str):
+
+@worker_process_init.connect
+def _reset_redis_pool(**kwargs):
+    """Gives each forked worker process its own connections instead of the parent's."""
+    if redis_client:
+        redis_client.connection_pool.reset()
+
+# Created once when the module is imported, so tasks can write results without checking for it
+RESULT_DIR = Path(settings.RESULT_FILE_DIR)
+RESULT_DIR.mkdir(parents=True, exist_ok=True)
+
+# Uploaded SRT payloads are staged in Redis under this prefix until a worker picks them up.
+SOURCE_KEY_PREFIX = "srt:source:"
+SOURCE_TTL_SECONDS = 60 * 60
+
+# Completed tasks are remembered by content hash so identical uploads reuse the earlier result.
+RESULT_CACHE_PREFIX = "srt-result:"
+RESULT_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Batch progress is written to the result backend only when it has moved this far
+# since the last write, or when the last batch finishes.
+PROGRESS_REPORT_STEP = 0.02
+
+# Throttled progress writes closer together than this are dropped. The API caches a
+# running task's status for 0.5s, so pollers would not see them anyway.
+PROGRESS_MIN_INTERVAL = 0.5
+
+
+class ProgressTask(Task):
     """
-    A Celery task to translate an SRT file.
-    Orchestrates SRT processing and translation services.
+    Task base class that rate-limits periodic update_state writes to the result backend.
+    Only writes made with throttle=True can be dropped; stage transitions and terminal
+    states are always written.
     """
-    logger.info(f"Task {self.request.id} started: file={source_file_path}, lang={target_language}, model={model}")
-    
+    _last_progress_writes: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+    _last_progress_lock = threading.Lock()
+
+    def update_state(self, task_id=None, state=None, meta=None, throttle=False, **kwargs):
+        if state not in states.READY_STATES:
+            key = task_id or self.request.id
+            now = time.monotonic()
+            with self._last_progress_lock:
+                last = self._last_progress_writes.get(key)
+                if throttle and last is not None and now - last < PROGRESS_MIN_INTERVAL:
+                    return
+                self._last_progress_writes[key] = now
+        super().update_state(task_id=task_id, state=state, meta=meta, **kwargs)
+
+
+def stage_source(data: bytes) -> str:
+    """Stores uploaded SRT bytes in Redis and returns the key to pass to the task."""
     if not redis_client:
-        raise ConnectionError("Redis client is not available. Cannot proceed with rate limiting.")
+        raise ConnectionError("Redis client is not available. Cannot stage the uploaded file.")
+    source_key = f"{SOURCE_KEY_PREFIX}{uuid.uuid4().hex}"
+    redis_client.set(source_key, data, ex=SOURCE_TTL_SECONDS)
+    return source_key
 
-    try:
-        self.update_state(state='PROCESSING', meta={'progress': 0.05, 'message': 'Initializing...'})
-        
-        # 1. Initialize Services with Rate Limiter
+
+def result_cache_key(data: bytes, target_language: str, model: str) -> str:
+    """Builds the memoization key for an upload from its content digest and translation options."""
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return f"{RESULT_CACHE_PREFIX}{digest}:{target_language}:{model}"
+
+
+def find_cached_result(cache_key: str) -> Optional[str]:
+    """Returns the id of a previous task that translated the same content, if any."""
+    if not redis_client:
+        return None
+    task_id = redis_client.get(cache_key)
+    return task_id.decode() if task_id is not None else None
+
+
+def _pop_source(source_key: str) -> bytes:
+    """Fetches and removes a staged SRT payload from Redis."""
+    p = redis_client.pipeline()
+    p.get(source_key)
+    p.delete(source_key)
+    data, _ = p.execute()
+    if data is None:
+        raise FileNotFoundError(f"Source payload {source_key} not found or expired.")
+    return data
+
+
+# Translation services are kept per worker thread and reused by later tasks, so their
+# HTTP/2 connection pool (and the TLS sessions in it) outlives a single task. They are
+# per thread because their client is bound to the thread's persistent event loop.
+_translators = threading.local()
+
+
+def _get_translator(model: str) -> TranslationService:
+    """Returns this thread's translation service for the model, creating it on first use."""
+    translators = getattr(_translators, "by_key", None)
+    if translators is None:
+        translators = _translators.by_key = {}
+    key = (settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL, model)
+    translator = translators.get(key)
+    if translator is None:
         rate_limiter = RateLimiter(
             redis_client=redis_client,
             key="openai_api_limit",
-            limit=1,  # 1 request
-            period=2  # per 2 seconds
+            limit=settings.OPENAI_REQUESTS_PER_MINUTE,
+            period=60,
+            token_limit=settings.OPENAI_TOKENS_PER_MINUTE,
+            token_period=60
         )
-        processor = SRTProcessor(file_path=source_file_path)
-        translator = TranslationService(
+        translator = translators[key] = TranslationService(
             api_key=settings.OPENAI_API_KEY,
             base_url=settings.OPENAI_BASE_URL,
             model=model,
-            rate_limiter=rate_limiter
+            rate_limiter=rate_limiter,
+            cache=redis_client
         )
+    return translator
+
+
+@celery_app.task(bind=True, base=ProgressTask)
+def translate_srt_task(self: Task, source_key: str, filename: str, target_language: str, model: str):
+    """
+    A Celery task to translate an SRT file.
+    Orchestrates SRT processing and translation services.
+    """
+    logger.info("Task %s started: file=%s, lang=%s, model=%s", self.request.id, filename, target_language, model)
+    
+    if not redis_client:
+        raise ConnectionError("Redis client is not available. Cannot proceed with rate limiting.")
 
-        # 2. Parse and Batch
+    try:
+        source_bytes = _pop_source(source_key)
+        self.update_state(state='PROCESSING', meta={'progress': 0.05, 'message': 'Initializing...'})
+        
+        # 1. Parse
         self.update_state(state='PROCESSING', meta={'progress': 0.1, 'message': 'Parsing SRT file...'})
+        processor = SRTProcessor(content=source_bytes, name=filename)
         processor.parse()
-        batches = processor.batch_for_translation()
-        
-        if not batches:
+        num_units = processor.count_translation_units()
+
+        if not num_units:
             logger.warning("No text found in SRT file for translation.")
             # If the file is empty, we can consider it a success with an empty result.
-            result_path = _get_result_path(source_file_path)
+            # This returns before any translation service or rate limiter is set up.
+            result_path = _get_result_path(filename)
             processor.write(str(result_path))
+            _write_compressed_copy(result_path)
+            _remember_result(source_bytes, target_language, model, self.request.id)
             return {"result_path": str(result_path)}
 
+        # 2. Initialize Services with Rate Limiter, and Batch
+        translator = _get_translator(model)
+        batch_size = translator.suggest_batch_size(target_language)
+        num_batches = -(-num_units // batch_size)
+
         # 3. Translate
         self.update_state(state='PROCESSING', meta={'progress': 0.3, 'message': 'Translating...'})
-        all_translated_units = []
-        num_batches = len(batches)
-        start_progress = 0.3
-        end_progress = 0.8
-        
-        for i, batch in enumerate(batches):
-            progress = start_progress + (i / num_batches) * (end_progress - start_progress)
-            self.update_state(
-                state='PROCESSING', 
-                meta={'progress': round(progress, 2), 'message': f'Translating batch {i+1}/{num_batches}...'}
-            )
-            logger.debug(f"Task {self.request.id}: Translating batch {i+1}/{num_batches}")
-            translated_batch = translator.translate_batch(batch, target_language)
-            all_translated_units.extend(translated_batch)
+        # Batches are built as workers pick them up and filed into the processor as they
+        # come back, so neither all source batches nor all translations are held at once.
+        try:
+            run_in_worker_loop(_translate_batches(
+                self, translator, processor, processor.iter_batches(batch_size), num_batches, target_language
+            ))
+        finally:
+            # Batch size statistics are written once per task, outside the event loop.
+            translator.flush_batch_stats()
 
         # 4. Reconstruct
         self.update_state(state='PROCESSING', meta={'progress': 0.8, 'message': 'Reconstructing file...'})
-        processor.reconstruct(all_translated_units)
+        processor.finish_reconstruction()
 
         # 5. Save Result
         self.update_state(state='PROCESSING', meta={'progress': 0.9, 'message': 'Saving result...'})
-        result_path = _get_result_path(source_file_path)
+        result_path = _get_result_path(filename)
         processor.write(str(result_path))
+        _write_compressed_copy(result_path)
 
-        logger.info(f"Task {self.request.id} completed. Result saved to {result_path}")
+        _remember_result(source_bytes, target_language, model, self.request.id)
+        logger.info("Task %s completed. Result saved to %s", self.request.id, result_path)
         # The final state is automatically set to SUCCESS upon return
         return {"result_path": str(result_path), "progress": 1.0}
 
     except Exception as e:
-        logger.error(f"Task {self.request.id} failed: {e}", exc_info=True)
+        logger.error("Task %s failed: %s", self.request.id, e, exc_info=True)
         self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)})
         raise e
 
-def _get_result_path(source_file_path: str) -> Path:
+async def _translate_batches(task: Task, translator: TranslationService, processor: SRTProcessor,
+                             batches: Iterator[List[Dict[str, Any]]], num_batches: int, target_language: str):
+    """
+    Translates the batches on one event loop with OPENAI_MAX_CONCURRENCY workers pulling
+    from the batch iterator, files each translated batch into the processor, and reports
+    progress between 0.3 and 0.8 as batches complete.
+    """
+    start_progress = 0.3
+    end_progress = 0.8
+    numbered_batches = enumerate(batches)
+    completed = 0
+    last_reported = start_progress
+    # The request context is thread-local, so the id is passed explicitly to the writer thread.
+    task_id = task.request.id
+    # Backend writes run in a worker thread; the lock keeps them in the order they were made.
+    report_lock = asyncio.Lock()
+
+    async def _worker():
+        nonlocal completed, last_reported
+        for i, batch in numbered_batches:
+            logger.debug("Task %s: Translating batch %d/%d", task_id, i + 1, num_batches)
+            translated_batch = await translator.translate_batch(batch, target_language)
+            processor.add_translated_units(translated_batch)
+            completed += 1
+            progress = start_progress + (completed / num_batches) * (end_progress - start_progress)
+            if progress - last_reported >= PROGRESS_REPORT_STEP or completed == num_batches:
+                last_reported = progress
+                meta = {'progress': round(progress, 2), 'message': f'Translated batch {completed}/{num_batches}...'}
+                # The last batch is always written so pollers do not stay on a stale count.
+                throttle = completed != num_batches
+                async with report_lock:
+                    await asyncio.to_thread(
+                        task.update_state, task_id=task_id, state='PROCESSING', meta=meta, throttle=throttle
+                    )
+
+    # A failing batch cancels the other workers instead of leaving them running
+    async with asyncio.TaskGroup() as group:
+        for _ in range(min(settings.OPENAI_MAX_CONCURRENCY, num_batches)):
+            group.create_task(_worker())
+
+def _get_result_path(filename: str) -> Path:
     """Generates a unique path for the translated file."""
-    source_p = Path(source_file_path)
-    result_dir = Path(settings.RESULT_FILE_DIR)
-    result_dir.mkdir(exist_ok=True)
-    return result_dir / f"translated_{uuid.uuid4().hex[:8]}_{source_p.name}"
\ No newline at end of file
+    source_p = Path(filename)
+    return RESULT_DIR / f"translated_{secrets.token_hex(4)}_{source_p.name}"
+
+def compressed_path(result_path: Path) -> Path:
+    """Returns the location of the gzip copy that is served to clients accepting gzip."""
+    return result_path.with_suffix(result_path.suffix + ".gz")
+
+
+def _write_compressed_copy(result_path: Path):
+    """Writes a gzip copy of the result once so downloads don't recompress it per request."""
+    with open(result_path, "rb") as src, gzip.open(compressed_path(result_path), "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+
+def _remember_result(source_bytes: bytes, target_language: str, model: str, task_id: str):
+    """Records the task that produced a result so identical uploads can reuse it."""
+    cache_key = result_cache_key(source_bytes, target_language, model)
+    redis_client.set(cache_key, task_id, ex=RESULT_CACHE_TTL_SECONDS)
@@ -0,0 +1,13 @@
+"""
+Shared setup for the server tests
+服务端测试的公共配置
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Settings are read on first import, so the environment is set before any app module loads
+os.environ.setdefault("API_KEY", "test-key")
+os.environ.setdefault("RESULT_FILE_DIR", tempfile.mkdtemp())
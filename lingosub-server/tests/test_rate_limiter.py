@@ -0,0 +1,109 @@
+"""
+Tests for RateLimiter
+基于 fakeredis 的令牌桶限流器单元测试
+"""
+
+import pytest
+import asyncio
+from types import SimpleNamespace
+
+import fakeredis
+
+from app.services import rate_limiter
+from app.services.rate_limiter import RateLimiter
+
+
+class FakeClock:
+    """可手动推进的时钟，sleep 直接推进时间"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter:
+    """RateLimiter 测试类"""
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(time=clock.time, sleep=clock.sleep))
+        return clock
+
+    @pytest.fixture
+    def redis_client(self):
+        return fakeredis.FakeRedis()
+
+    def test_permits_exhausted_then_refilled(self, redis_client, clock):
+        """测试许可耗尽后需要等待，按速率补充后可再次获取"""
+        limiter = RateLimiter(redis_client, "test", limit=2, period=1)
+
+        assert limiter._try_acquire() == 0
+        assert limiter._try_acquire() == 0
+        assert limiter._try_acquire() == pytest.approx(0.5)
+
+        clock.now += 0.5
+        assert limiter._try_acquire() == 0
+        assert limiter._try_acquire() == pytest.approx(0.5)
+
+    def test_acquire_waits_for_refill(self, redis_client, clock):
+        """测试 acquire 阻塞等待直到许可补充"""
+        limiter = RateLimiter(redis_client, "test", limit=1, period=2)
+
+        limiter.acquire()
+        limiter.acquire()
+
+        assert clock.slept == [pytest.approx(2.0)]
+
+    def test_token_cost_rejected_without_taking_permit(self, redis_client, clock):
+        """测试 token 预算不足时拒绝请求，且不消耗请求许可"""
+        limiter = RateLimiter(redis_client, "test", limit=10, period=1, token_limit=100, token_period=1)
+
+        assert limiter._try_acquire(tokens=60) == 0
+        assert limiter._try_acquire(tokens=60) == pytest.approx(0.2)
+        # 被拒绝的请求没有扣除请求桶，只扣过一次
+        assert float(redis_client.hget("test", "tokens")) == pytest.approx(9)
+        assert float(redis_client.hget("test:tokens", "tokens")) == pytest.approx(40)
+
+    def test_token_cost_capped_at_budget(self, redis_client, clock):
+        """测试超过整个预算的请求在桶满时可以通过，而不是永远等待"""
+        limiter = RateLimiter(redis_client, "test", limit=10, period=1, token_limit=100, token_period=1)
+
+        assert limiter._try_acquire(tokens=500) == 0
+        assert limiter._try_acquire(tokens=1) == pytest.approx(0.01)
+
+    def test_pause_blocks_later_acquires(self, redis_client, clock):
+        """测试 pause 之后的 acquire 要等到暂停结束"""
+        limiter = RateLimiter(redis_client, "test", limit=10, period=1)
+
+        limiter.pause(5)
+        # 暂停期间键不能先于暂停结束过期
+        assert redis_client.ttl("test") > 5
+
+        assert limiter._try_acquire() == pytest.approx(5)
+        limiter.acquire()
+        assert sum(clock.slept) == pytest.approx(5)
+
+    @pytest.mark.asyncio
+    async def test_pause_async_blocks_acquire_async(self, redis_client, clock, monkeypatch):
+        """测试异步暂停与异步获取"""
+        slept = []
+
+        async def fake_sleep(seconds):
+            slept.append(seconds)
+            clock.now += seconds
+
+        monkeypatch.setattr(rate_limiter, "asyncio", SimpleNamespace(to_thread=asyncio.to_thread, sleep=fake_sleep))
+        limiter = RateLimiter(redis_client, "test", limit=10, period=1)
+
+        await limiter.pause_async(3)
+        await limiter.acquire_async()
+
+        assert sum(slept) == pytest.approx(3)
@@ -0,0 +1,128 @@
+"""
+Tests for SRTProcessor
+SRT 解析、分批、重建与写出的单元测试
+"""
+
+import pytest
+
+from app.services.srt_processor import SRTProcessor, Subtitle
+
+
+SAMPLE = (
+    "1\n"
+    "00:00:01,000 --> 00:00:02,500\n"
+    "Hello, world!\n"
+    "\n"
+    "2\n"
+    "00:00:03,000 --> 00:00:04,000 X1:100 X2:200\n"
+    "First line\n"
+    "Second line\n"
+    "\n"
+    "3\n"
+    "00:00:05.000 --> 00:00:06.000\n"
+    "Last entry"
+)
+
+EXPECTED = [
+    Subtitle(1, "00:00:01,000", "00:00:02,500", "Hello, world!"),
+    Subtitle(2, "00:00:03,000", "00:00:04,000", "First line\nSecond line", "X1:100 X2:200"),
+    Subtitle(3, "00:00:05,000", "00:00:06,000", "Last entry"),
+]
+
+
+def parse(content: bytes):
+    processor = SRTProcessor(content=content, name="test.srt")
+    processor.parse()
+    return processor
+
+
+class TestSRTProcessor:
+    """SRTProcessor 测试类"""
+
+    def test_parse_entries(self):
+        """测试解析多行条目、位置信息以及末尾没有空行的条目"""
+        assert parse(SAMPLE.encode()).subs == EXPECTED
+
+    def test_parse_with_bom(self):
+        """测试带 UTF-8 BOM 的文件"""
+        assert parse(b"\xef\xbb\xbf" + SAMPLE.encode()).subs == EXPECTED
+
+    def test_parse_crlf(self):
+        """测试 CRLF 换行，多行文本统一为 LF"""
+        assert parse(SAMPLE.replace("\n", "\r\n").encode()).subs == EXPECTED
+
+    def test_parse_file_uses_same_parser(self, tmp_path):
+        """测试从磁盘文件（mmap）解析与从内存解析结果一致"""
+        path = tmp_path / "test.srt"
+        path.write_bytes(b"\xef\xbb\xbf" + SAMPLE.replace("\n", "\r\n").encode())
+
+        processor = SRTProcessor(file_path=str(path))
+        processor.parse()
+
+        assert processor.subs == EXPECTED
+
+    def test_empty_file_has_no_entries(self, tmp_path):
+        """测试空文件解析为空列表，重建时报错"""
+        path = tmp_path / "empty.srt"
+        path.write_bytes(b"")
+
+        for processor in (SRTProcessor(file_path=str(path)), SRTProcessor(content=b"")):
+            processor.parse()
+            assert processor.subs == []
+            assert processor.count_translation_units() == 0
+            assert list(processor.iter_batches(10)) == []
+            with pytest.raises(ValueError):
+                processor.finish_reconstruction()
+
+    def test_missing_source_errors(self, tmp_path):
+        """测试缺少文件或内容时报错，未解析前不能写出"""
+        with pytest.raises(ValueError):
+            SRTProcessor()
+        with pytest.raises(FileNotFoundError):
+            SRTProcessor(file_path=str(tmp_path / "missing.srt"))
+        with pytest.raises(ValueError):
+            SRTProcessor(content=SAMPLE.encode()).write(str(tmp_path / "out.srt"))
+
+    def test_iter_batches_splits_lines(self):
+        """测试每行字幕是一个翻译单元，并按批大小切分"""
+        processor = parse(SAMPLE.encode())
+
+        batches = list(processor.iter_batches(2))
+
+        assert processor.count_translation_units() == 4
+        assert [[(u["original_index"], u["sub_index"], u["text"]) for u in batch] for batch in batches] == [
+            [(1, 0, "Hello, world!"), (2, 0, "First line")],
+            [(2, 1, "Second line"), (3, 0, "Last entry")],
+        ]
+
+    def test_round_trip(self, tmp_path):
+        """测试分批翻译、乱序回填、重建并写出后可以原样解析回来"""
+        processor = parse(SAMPLE.replace("\n", "\r\n").encode())
+        batches = list(processor.iter_batches(3))
+        # 各批完成顺序与发送顺序相反
+        for batch in reversed(batches):
+            processor.add_translated_units([{**unit, "text": f"T({unit['text']})"} for unit in batch])
+        processor.finish_reconstruction()
+
+        path = tmp_path / "out.srt"
+        processor.write(str(path))
+
+        written = SRTProcessor(file_path=str(path))
+        written.parse()
+        assert written.subs == [
+            Subtitle(1, "00:00:01,000", "00:00:02,500", "T(Hello, world!)"),
+            Subtitle(2, "00:00:03,000", "00:00:04,000", "T(First line)\nT(Second line)", "X1:100 X2:200"),
+            Subtitle(3, "00:00:05,000", "00:00:06,000", "T(Last entry)"),
+        ]
+        assert path.read_text(encoding="utf-8").startswith("1\n00:00:01,000 --> 00:00:02,500\nT(Hello, world!)\n\n2\n")
+
+    def test_write_in_chunks(self, tmp_path, monkeypatch):
+        """测试分块写出时条目完整且顺序不变"""
+        monkeypatch.setattr(SRTProcessor, "WRITE_CHUNK_ENTRIES", 2)
+        content = "".join(f"{i}\n00:00:0{i},000 --> 00:00:0{i},500\nline {i}\n\n" for i in range(1, 6))
+        processor = parse(content.encode())
+
+        path = tmp_path / "out.srt"
+        processor.write(str(path))
+
+        assert path.read_text(encoding="utf-8") == content
@@ -0,0 +1,197 @@
+"""
+Tests for the task endpoints
+任务接口的单元测试：结果等待、状态缓存、结果复用与批量状态查询，Redis 由 fakeredis 模拟
+"""
+
+import pytest
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import fakeredis
+import fakeredis.aioredis
+from cachetools import TTLCache
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.v1.dependencies import get_api_key
+from app.api.v1.endpoints import tasks as task_endpoints
+from app.worker import tasks as worker_tasks
+from app.worker.tasks import translate_srt_task, result_cache_key
+
+
+class FakeTimer:
+    """TTLCache 使用的可推进时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTaskEndpoints:
+    """任务接口测试类"""
+
+    @pytest.fixture
+    def redis_server(self, monkeypatch):
+        """让结果后端、异步结果客户端和 worker 客户端共用同一个 fakeredis"""
+        server = fakeredis.FakeServer()
+        sync_client = fakeredis.FakeRedis(server=server)
+        async_client = fakeredis.aioredis.FakeRedis(server=server)
+        # Celery 应用在每个线程各有一个后端实例，因此在类上替换客户端
+        monkeypatch.setattr(type(translate_srt_task.app.backend), "client", property(lambda backend: sync_client))
+        monkeypatch.setattr(task_endpoints, "result_redis", async_client)
+        monkeypatch.setattr(worker_tasks, "redis_client", sync_client)
+        return SimpleNamespace(sync=sync_client, async_=async_client)
+
+    @pytest.fixture
+    def status_timer(self, monkeypatch):
+        timer = FakeTimer()
+        monkeypatch.setattr(task_endpoints, "_status_cache", TTLCache(maxsize=100, ttl=task_endpoints.STATUS_CACHE_TTL, timer=timer))
+        return timer
+
+    @pytest.fixture
+    def delayed(self, monkeypatch):
+        """记录入队的任务，不真正发送到 Celery"""
+        calls = []
+
+        def fake_delay(**kwargs):
+            calls.append(kwargs)
+            return SimpleNamespace(id=str(uuid.uuid4()))
+
+        monkeypatch.setattr(translate_srt_task, "delay", fake_delay)
+        return calls
+
+    @pytest.fixture
+    def client(self, redis_server, status_timer, delayed):
+        app.dependency_overrides[get_api_key] = lambda: "test-key"
+        yield TestClient(app)
+        app.dependency_overrides.pop(get_api_key, None)
+
+    def _store(self, task_id, result, state):
+        translate_srt_task.app.backend.store_result(task_id, result, state)
+
+    def test_result_returned_when_task_finishes_during_wait(self, client, tmp_path):
+        """测试结果接口通过 pub/sub 等到任务完成后直接返回文件"""
+        task_id = str(uuid.uuid4())
+        result_path = tmp_path / "translated.srt"
+        result_path.write_text("1\n00:00:01,000 --> 00:00:02,000\nT(hello)\n", encoding="utf-8")
+
+        def finish():
+            time.sleep(0.2)
+            self._store(task_id, {"result_path": str(result_path)}, "SUCCESS")
+
+        worker = threading.Thread(target=finish)
+        worker.start()
+        started = time.monotonic()
+        response = client.get(f"/api/v1/tasks/{task_id}/result", headers={"Accept-Encoding": "identity"})
+        elapsed = time.monotonic() - started
+        worker.join()
+
+        assert response.status_code == 200
+        assert "T(hello)" in response.text
+        assert 0.2 <= elapsed < task_endpoints.RESULT_WAIT_TIMEOUT
+
+    def test_result_wait_times_out_for_running_task(self, client, monkeypatch):
+        """测试任务在等待时间内未完成时返回 404"""
+        monkeypatch.setattr(task_endpoints, "RESULT_WAIT_TIMEOUT", 0.2)
+        task_id = str(uuid.uuid4())
+        self._store(task_id, {"progress": 0.5}, "PROCESSING")
+
+        response = client.get(f"/api/v1/tasks/{task_id}/result")
+
+        assert response.status_code == 404
+        assert "PROCESSING" in response.json()["detail"]
+
+    def test_running_status_cached_for_ttl(self, client, status_timer):
+        """测试运行中的状态在 TTL 内复用缓存，终态不缓存"""
+        task_id = str(uuid.uuid4())
+        self._store(task_id, {"progress": 0.4}, "PROCESSING")
+        assert client.get(f"/api/v1/tasks/{task_id}/status").json()["progress"] == 0.4
+
+        self._store(task_id, {"progress": 0.6}, "PROCESSING")
+        assert client.get(f"/api/v1/tasks/{task_id}/status").json()["progress"] == 0.4
+
+        status_timer.now += task_endpoints.STATUS_CACHE_TTL
+        assert client.get(f"/api/v1/tasks/{task_id}/status").json()["progress"] == 0.6
+
+        status_timer.now += task_endpoints.STATUS_CACHE_TTL
+        self._store(task_id, {"result_path": "/missing.srt"}, "SUCCESS")
+        assert client.get(f"/api/v1/tasks/{task_id}/status").json()["status"] == "SUCCESS"
+        assert task_id not in task_endpoints._status_cache
+
+    def test_identical_upload_reuses_finished_task(self, client, delayed, redis_server, tmp_path):
+        """测试相同内容和选项的上传直接复用已完成任务，不再入队"""
+        data = b"1\n00:00:01,000 --> 00:00:02,000\nhello\n"
+        task_id = str(uuid.uuid4())
+        result_path = tmp_path / "translated.srt"
+        result_path.write_bytes(data)
+        self._store(task_id, {"result_path": str(result_path)}, "SUCCESS")
+        redis_server.sync.set(result_cache_key(data, "French", "gpt-4.1-mini"), task_id)
+
+        response = client.post("/api/v1/tasks", files={"file": ("a.srt", data)}, data={"target_language": "French"})
+        assert response.status_code == 202
+        assert response.json() == {"task_id": task_id, "status": "SUCCESS"}
+        assert delayed == []
+
+        # 其他目标语言不复用
+        response = client.post("/api/v1/tasks", files={"file": ("a.srt", data)}, data={"target_language": "German"})
+        assert response.json()["status"] == "PENDING"
+        assert len(delayed) == 1
+        assert redis_server.sync.get(delayed[0]["source_key"]) == data
+
+    def test_memo_ignored_when_result_file_is_gone(self, client, delayed, redis_server):
+        """测试已复用任务的结果文件不存在时重新入队"""
+        data = b"1\n00:00:01,000 --> 00:00:02,000\nhello\n"
+        task_id = str(uuid.uuid4())
+        self._store(task_id, {"result_path": "/missing/translated.srt"}, "SUCCESS")
+        redis_server.sync.set(result_cache_key(data, "French", "gpt-4.1-mini"), task_id)
+
+        response = client.post("/api/v1/tasks", files={"file": ("a.srt", data)}, data={"target_language": "French"})
+
+        assert response.json()["status"] == "PENDING"
+        assert response.json()["task_id"] != task_id
+        assert len(delayed) == 1
+
+    def test_batch_status_reads_all_tasks_in_one_mget(self, client, redis_server, monkeypatch):
+        """测试批量状态通过一次 MGET 读取，并按请求顺序返回"""
+        ids = [str(uuid.uuid4()) for _ in range(4)]
+        self._store(ids[0], {"result_path": "/a.srt"}, "SUCCESS")
+        self._store(ids[1], ValueError("boom"), "FAILURE")
+        self._store(ids[2], {"progress": 0.6}, "PROCESSING")
+
+        mget_calls = []
+        original_mget = redis_server.async_.mget
+
+        async def counting_mget(keys):
+            mget_calls.append(len(keys))
+            return await original_mget(keys)
+
+        monkeypatch.setattr(redis_server.async_, "mget", counting_mget)
+        response = client.post("/api/v1/tasks/status:batch", json=ids)
+
+        assert response.status_code == 200
+        assert [(s["task_id"], s["status"], s["progress"], s["error_message"]) for s in response.json()] == [
+            (ids[0], "SUCCESS", 1.0, None),
+            (ids[1], "FAILURE", None, "boom"),
+            (ids[2], "PROCESSING", 0.6, None),
+            (ids[3], "PENDING", None, None),
+        ]
+        assert mget_calls == [4]
+
+    def test_batch_status_limit(self, client):
+        """测试批量状态最多接受 MAX_BATCH_STATUS_IDS 个任务"""
+        limit = task_endpoints.MAX_BATCH_STATUS_IDS
+
+        response = client.post("/api/v1/tasks/status:batch", json=[str(uuid.uuid4()) for _ in range(limit)])
+        assert response.status_code == 200
+        assert len(response.json()) == limit
+        assert all(s["status"] == "PENDING" for s in response.json())
+
+        response = client.post("/api/v1/tasks/status:batch", json=[str(uuid.uuid4()) for _ in range(limit + 1)])
+        assert response.status_code == 400
+
+        response = client.post("/api/v1/tasks/status:batch", json=[])
+        assert response.json() == []
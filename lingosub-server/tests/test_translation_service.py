@@ -0,0 +1,248 @@
+"""
+Tests for TranslationService
+TranslationService 各翻译路径的单元测试，模型接口由 httpx.MockTransport 模拟
+"""
+
+import pytest
+import json
+import re
+
+import fakeredis
+import httpx
+from openai import AsyncOpenAI
+
+from app.services import translation_service
+from app.services.translation_service import (
+    FRAGMENT_SEPARATOR,
+    JOINED_SYSTEM_PROMPT,
+    SINGLE_TEXT_SYSTEM_PROMPT,
+    TranslationService,
+)
+
+
+NUMBERED_LINE_RE = re.compile(r'^(\d+)\. (.*)$')
+
+
+def completion(content):
+    """构造非流式 chat completion 响应体"""
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "test-model",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+class FakeModel:
+    """模拟模型接口：把每段文本翻译为 T(text)，并记录每个请求"""
+
+    def __init__(self, joined_extra=0, structured="ok", rate_limited=0, chunk_size=8):
+        self.joined_extra = joined_extra
+        self.structured = structured
+        self.rate_limited = rate_limited
+        self.chunk_size = chunk_size
+        self.requests = []
+        self.streamed_chunks = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        system, user = body["messages"][0]["content"], body["messages"][-1]["content"]
+        text = user.split("\n\n", 1)[1]
+        if self.rate_limited:
+            self.rate_limited -= 1
+            self.requests.append("429")
+            return httpx.Response(429, headers={"retry-after": "2"}, json={"error": {"message": "rate limited"}})
+
+        if system == JOINED_SYSTEM_PROMPT:
+            self.requests.append(("joined", text))
+            fragments = text.split(FRAGMENT_SEPARATOR)
+            # joined_extra > 0 多返回片段，< 0 少返回片段
+            if self.joined_extra > 0:
+                fragments += fragments[:self.joined_extra]
+            elif self.joined_extra < 0:
+                fragments = fragments[:self.joined_extra]
+            return self._stream(FRAGMENT_SEPARATOR.join(f"T({f})" for f in fragments))
+        if system == SINGLE_TEXT_SYSTEM_PROMPT:
+            self.requests.append(("single", text))
+            return httpx.Response(200, json=completion(f"T({text})"))
+
+        lines = [NUMBERED_LINE_RE.match(line).groups() for line in text.splitlines()]
+        if "response_format" in body:
+            self.requests.append(("structured", text))
+            if self.structured == "rejected":
+                return httpx.Response(400, json={"error": {"message": "response_format is not supported"}})
+            items = [{"i": int(number), "t": f"T({line})"} for number, line in lines]
+            return httpx.Response(200, json=completion(json.dumps({"items": items})))
+        self.requests.append(("numbered", text))
+        return httpx.Response(200, json=completion("\n".join(f"{number}. T({line})" for number, line in lines)))
+
+    def _stream(self, content):
+        """以 SSE 分块返回内容，并记录服务端实际发送的块数"""
+        parts = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+        sent = []
+        self.streamed_chunks.append((sent, len(parts)))
+
+        async def events():
+            for part in parts:
+                sent.append(part)
+                chunk = {
+                    "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "test-model",
+                    "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+    def kinds(self):
+        return [request if request == "429" else request[0] for request in self.requests]
+
+
+class FakeRateLimiter:
+    """记录许可申请与暂停的限流器"""
+
+    def __init__(self):
+        self.acquired = []
+        self.paused = []
+
+    async def acquire_async(self, tokens=0, permits=1):
+        self.acquired.append(tokens)
+        return True
+
+    async def pause_async(self, seconds):
+        self.paused.append(seconds)
+
+
+def make_batch(texts):
+    return [{"original_index": i, "sub_index": 0, "text": text} for i, text in enumerate(texts)]
+
+
+def translated(batch):
+    return [item['text'] for item in batch]
+
+
+class TestTranslationService:
+    """TranslationService 测试类"""
+
+    @pytest.fixture
+    def make_service(self):
+        """创建使用模拟模型接口的翻译服务"""
+        def _make(model, cache=None, structured_outputs=False):
+            service = TranslationService(
+                api_key="test-key", model="test-model", rate_limiter=FakeRateLimiter(),
+                base_url="http://model.test/v1", cache=cache, max_concurrency=4,
+            )
+            service.client = AsyncOpenAI(
+                api_key="test-key", base_url="http://model.test/v1", max_retries=0,
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(model)),
+            )
+            service.structured_outputs = structured_outputs
+            return service
+
+        return _make
+
+    @pytest.mark.asyncio
+    async def test_joined_batch_translated_in_one_request(self, make_service):
+        """测试整批以分隔符拼接的形式一次请求翻译完成"""
+        model = FakeModel()
+        service = make_service(model)
+        texts = [f"line {i}" for i in range(6)]
+
+        result = await service.translate_batch(make_batch(texts), "French")
+
+        assert translated(result) == [f"T({text})" for text in texts]
+        assert [item['original_index'] for item in result] == list(range(6))
+        assert model.kinds() == ["joined"]
+
+    @pytest.mark.asyncio
+    async def test_joined_stream_aborted_on_extra_separators(self, make_service):
+        """测试流式输出分隔符超出预期时提前中止，并回退到编号列表"""
+        model = FakeModel(joined_extra=6, chunk_size=4)
+        service = make_service(model)
+        texts = [f"line {i}" for i in range(6)]
+
+        result = await service.translate_batch(make_batch(texts), "French")
+
+        assert translated(result) == [f"T({text})" for text in texts]
+        assert model.kinds() == ["joined", "numbered"]
+        sent, total = model.streamed_chunks[0]
+        assert len(sent) < total
+
+    @pytest.mark.asyncio
+    async def test_structured_outputs_used_after_joined_mismatch(self, make_service):
+        """测试拼接结果数量不符时使用结构化输出的编号列表"""
+        model = FakeModel(joined_extra=-1)
+        service = make_service(model, structured_outputs=True)
+        texts = [f"line {i}" for i in range(6)]
+
+        result = await service.translate_batch(make_batch(texts), "French")
+
+        assert translated(result) == [f"T({text})" for text in texts]
+        assert model.kinds() == ["joined", "structured"]
+        assert service.structured_outputs
+
+    @pytest.mark.asyncio
+    async def test_rejected_structured_outputs_fall_back_to_plain_list(self, make_service):
+        """测试接口拒绝结构化输出时改用普通编号列表并关闭该功能"""
+        model = FakeModel(joined_extra=-1, structured="rejected")
+        service = make_service(model, structured_outputs=True)
+        texts = [f"line {i}" for i in range(6)]
+
+        result = await service.translate_batch(make_batch(texts), "French")
+
+        assert translated(result) == [f"T({text})" for text in texts]
+        assert model.kinds() == ["joined", "structured", "numbered"]
+        assert not service.structured_outputs
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_request_pauses_limiter_and_retries(self, make_service):
+        """测试 429 响应按 Retry-After 暂停限流器后重试"""
+        model = FakeModel(rate_limited=1)
+        service = make_service(model)
+        texts = [f"line {i}" for i in range(6)]
+
+        result = await service.translate_batch(make_batch(texts), "French")
+
+        assert translated(result) == [f"T({text})" for text in texts]
+        assert model.kinds() == ["429", "joined"]
+        assert service.rate_limiter.paused == [2.0]
+        assert len(service.rate_limiter.acquired) == 2
+
+    @pytest.mark.asyncio
+    async def test_passthrough_and_repeated_lines_sent_once(self, make_service):
+        """测试无需翻译的行原样保留，重复文本只发送一次"""
+        model = FakeModel()
+        service = make_service(model)
+        texts = ["♪", "hello", "123", "https://example.com/a", "hello", "world", "...", "world"]
+
+        result = await service.translate_batch(make_batch(texts), "French")
+
+        assert translated(result) == ["♪", "T(hello)", "123", "https://example.com/a", "T(hello)", "T(world)", "...", "T(world)"]
+        assert model.requests == [("single", "hello"), ("single", "world")]
+
+    @pytest.mark.asyncio
+    async def test_cached_lines_not_requested_again(self, make_service):
+        """测试 Redis 行缓存命中的文本不再请求模型"""
+        model = FakeModel()
+        service = make_service(model, cache=fakeredis.FakeRedis())
+        texts = [f"line {i}" for i in range(6)]
+
+        first = await service.translate_batch(make_batch(texts), "French")
+        second = await service.translate_batch(make_batch(texts + ["line 6"]), "French")
+
+        assert translated(second) == translated(first) + ["T(line 6)"]
+        assert model.kinds() == ["joined", "single"]
+
+    @pytest.mark.asyncio
+    async def test_batch_over_context_budget_split_into_ranges(self, make_service, monkeypatch):
+        """测试超出上下文预算的批次先按预算切分为多个请求"""
+        monkeypatch.setattr(translation_service, "count_text_tokens", lambda model, text: 100)
+        # 提示开销 300，每行 100 + 40，预算内每段最多 5 行
+        monkeypatch.setattr(translation_service, "MODEL_CONTEXT_BUDGET", 1000)
+        model = FakeModel()
+        service = make_service(model)
+        texts = [f"line {i}" for i in range(15)]
+
+        result = await service.translate_batch(make_batch(texts), "French")
+
+        assert translated(result) == [f"T({text})" for text in texts]
+        assert model.kinds() == ["joined"] * 3
+        assert sorted(len(text.split(FRAGMENT_SEPARATOR)) for _, text in model.requests) == [5, 5, 5]
@@ -0,0 +1,139 @@
+"""
+Tests for translate_file
+translate_file 并发批处理的单元测试
+"""
+
+import pytest
+import asyncio
+
+import httpx
+from openai import RateLimitError
+
+from app.services import translator
+from app.services.translator import AdaptiveBatcher, parse_srt, translate_file
+
+
+TEXT_COUNT = 12
+# 每条文本计 10 个 token，初始预算 40，因此每批 4 条
+TOKENS_PER_TEXT = 10
+
+
+class FakeTranslator:
+    """模拟 _translate_batch，记录同时进行中的请求数"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.active = 0
+        self.peak = 0
+        self.calls = []
+
+    async def __call__(self, texts, target_language, model, client):
+        self.calls.append(list(texts))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await self.handler(texts, len(self.calls))
+        finally:
+            self.active -= 1
+
+
+class TestTranslateFile:
+    """translate_file 测试类"""
+
+    @pytest.fixture
+    def source_path(self, tmp_path, monkeypatch):
+        """创建测试用 SRT 文件，并固定 token 计数、批预算和并发数"""
+        monkeypatch.setattr(translator, "settings", translator.settings.model_copy(update={
+            "RESULT_FILE_DIR": str(tmp_path / "results"),
+            "OPENAI_MAX_CONCURRENCY": 4,
+        }))
+        monkeypatch.setattr(translator, "count_text_tokens", lambda model, text: TOKENS_PER_TEXT)
+        batcher = AdaptiveBatcher(current_budget=4 * TOKENS_PER_TEXT, min_budget=TOKENS_PER_TEXT)
+        monkeypatch.setattr(translator, "_get_batcher", lambda model: batcher)
+
+        path = tmp_path / "source.srt"
+        path.write_text("\n\n".join(
+            f"{i + 1}\n00:00:0{i % 10},000 --> 00:00:0{i % 10},500\ntext {i}" for i in range(TEXT_COUNT)
+        ), encoding="utf-8")
+        return path
+
+    async def _run(self, source_path, monkeypatch, fake):
+        monkeypatch.setattr(translator, "_translate_batch", fake)
+        result_path = await translate_file(source_path, "French", "test-model")
+        return [block.text for block in parse_srt(result_path.read_text(encoding="utf-8"))]
+
+    @pytest.mark.asyncio
+    async def test_all_batches_translated(self, source_path, monkeypatch):
+        """测试所有批次都被翻译并按原顺序写回"""
+        async def handler(texts, call):
+            await asyncio.sleep(0.01)
+            return [f"T({text})" for text in texts]
+
+        fake = FakeTranslator(handler)
+        texts = await self._run(source_path, monkeypatch, fake)
+
+        assert texts == [f"T(text {i})" for i in range(TEXT_COUNT)]
+        assert len(fake.calls) == 3
+        assert fake.peak == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_halves_run_concurrently(self, source_path, monkeypatch):
+        """测试失败批次拆分后的两半仍由多个 worker 并发处理"""
+        failed = asyncio.Event()
+        peak_after_failure = 0
+
+        async def handler(texts, call):
+            nonlocal peak_after_failure
+            if failed.is_set():
+                peak_after_failure = max(peak_after_failure, fake.active)
+            if texts[0] == "text 0" and len(texts) == 4:
+                # 其他批次先完成，队列暂时为空时才失败
+                await asyncio.sleep(0.05)
+                failed.set()
+                raise ValueError("Translation fragment count mismatch.")
+            await asyncio.sleep(0.05 if failed.is_set() else 0.01)
+            return [f"T({text})" for text in texts]
+
+        fake = FakeTranslator(handler)
+        texts = await self._run(source_path, monkeypatch, fake)
+
+        assert texts == [f"T(text {i})" for i in range(TEXT_COUNT)]
+        assert [len(batch) for batch in fake.calls[3:]] == [2, 2]
+        assert peak_after_failure == 2
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_batch_still_drained_by_all_workers(self, source_path, monkeypatch):
+        """测试一个批次被限流、其余批次已完成时，重试后的工作仍由多个 worker 并发处理"""
+        retried = asyncio.Event()
+        peak_after_retry = 0
+        finished_before_retry = []
+
+        async def handler(texts, call):
+            nonlocal peak_after_retry
+            if texts[0] == "text 0" and not retried.is_set():
+                retried.set()
+                raise RateLimitError("429", response=httpx.Response(
+                    429, headers={"retry-after": "0.05"}, request=httpx.Request("POST", "http://test")
+                ), body=None)
+            if texts[0] == "text 0":
+                peak_after_retry = max(peak_after_retry, fake.active)
+                if len(texts) == 4:
+                    # 重试后的批次格式错误，拆成两半
+                    raise ValueError("Translation fragment count mismatch.")
+                await asyncio.sleep(0.05)
+            elif texts[0] == "text 2":
+                peak_after_retry = max(peak_after_retry, fake.active)
+                await asyncio.sleep(0.05)
+            else:
+                await asyncio.sleep(0.01)
+                finished_before_retry.extend(texts)
+            return [f"T({text})" for text in texts]
+
+        fake = FakeTranslator(handler)
+        texts = await self._run(source_path, monkeypatch, fake)
+
+        assert texts == [f"T(text {i})" for i in range(TEXT_COUNT)]
+        # 限流等待期间其他批次已全部完成
+        assert finished_before_retry == [f"text {i}" for i in range(4, TEXT_COUNT)]
+        assert [batch[0] for batch in fake.calls[3:]] == ["text 0", "text 0", "text 2"]
+        assert peak_after_retry == 2
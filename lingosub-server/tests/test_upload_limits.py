@@ -0,0 +1,75 @@
+"""
+Tests for upload size limits
+上传接口 MAX_SRT_SIZE 限制的单元测试
+"""
+
+import pytest
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.v1.dependencies import get_api_key
+from app.api.v1.endpoints import tasks as task_endpoints
+
+
+MAX_SIZE = 1024
+
+
+class TestUploadLimits:
+    """上传大小限制测试类"""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        """创建测试客户端，跳过鉴权并替换任务入队"""
+        staged = []
+
+        async def fake_enqueue(data, filename, target_language, model):
+            staged.append(data)
+            return {"task_id": str(uuid.uuid4()), "status": "PENDING"}
+
+        monkeypatch.setattr(task_endpoints, "settings", task_endpoints.settings.model_copy(update={"MAX_SRT_SIZE": MAX_SIZE}))
+        monkeypatch.setattr(task_endpoints, "_enqueue_translation", fake_enqueue)
+        app.dependency_overrides[get_api_key] = lambda: "test-key"
+        client = TestClient(app)
+        client.staged = staged
+        yield client
+        app.dependency_overrides.pop(get_api_key, None)
+
+    def _upload(self, client, size):
+        return client.post(
+            "/api/v1/tasks",
+            files={"file": ("movie.srt", b"x" * size, "application/x-subrip")},
+            data={"target_language": "French"},
+        )
+
+    def _stream(self, client, size):
+        return client.post(
+            "/api/v1/tasks/stream",
+            content=b"x" * size,
+            headers={"X-Filename": "movie.srt", "X-Target-Language": "French"},
+        )
+
+    def test_multipart_upload_at_limit_accepted(self, client):
+        """测试 multipart 上传恰好等于上限时被接受"""
+        response = self._upload(client, MAX_SIZE)
+        assert response.status_code == 202
+        assert len(client.staged[0]) == MAX_SIZE
+
+    def test_multipart_upload_over_limit_rejected(self, client):
+        """测试 multipart 上传超过上限 1 字节时返回 413"""
+        response = self._upload(client, MAX_SIZE + 1)
+        assert response.status_code == 413
+        assert client.staged == []
+
+    def test_stream_upload_at_limit_accepted(self, client):
+        """测试流式上传恰好等于上限时被接受"""
+        response = self._stream(client, MAX_SIZE)
+        assert response.status_code == 202
+        assert len(client.staged[0]) == MAX_SIZE
+
+    def test_stream_upload_over_limit_rejected(self, client):
+        """测试流式上传超过上限 1 字节时返回 413"""
+        response = self._stream(client, MAX_SIZE + 1)
+        assert response.status_code == 413
+        assert client.staged == []
@@ -5,6 +5,7 @@ Python Sidecar Engine Base Class
 
 import asyncio
 import logging
+import time
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional, List
 from datetime import datetime
@@ -39,6 +40,9 @@ class BaseSidecarEngine(ABC):
         self.metrics = EngineMetrics(engine_id=self.engine_id)
         self.created_at = datetime.now()
         self.last_heartbeat = datetime.now()
+        # 单调时钟读数，用于计算运行时间和心跳间隔
+        self._started_at = time.monotonic()
+        self._last_heartbeat_at = self._started_at
         
         # 初始化引擎特定配置
         self._initialize_engine()
@@ -77,6 +81,7 @@ class BaseSidecarEngine(ABC):
         try:
             # 更新心跳时间
             self.last_heartbeat = datetime.now()
+            self._last_heartbeat_at = time.monotonic()
             
             # 解析请求类型
             request_type = request_data.get("type")
@@ -85,32 +90,37 @@ class BaseSidecarEngine(ABC):
                 # 转录请求
                 request = TranscriptionRequest(**request_data["payload"])
                 response = await self.transcribe(request)
-                return {
+                result = {
                     "status": "success",
-                    "data": response.model_dump(),
-                    "metrics": self.metrics.model_dump()
+                    "data": response.model_dump()
                 }
+                # 仅在调用方需要时附带指标
+                if request_data.get("include_metrics"):
+                    result["metrics"] = self.metrics.dump()
+                return result
             
             elif request_type == "health_check":
-                # 健康检查
+                # 健康检查 (指标复用缓存的序列化结果)
                 health = await self.health_check()
+                data = health.model_dump(exclude={"metrics"})
+                data["metrics"] = health.metrics.dump()
                 return {
                     "status": "success",
-                    "data": health.model_dump()
+                    "data": data
                 }
             
             elif request_type == "get_metrics":
                 # 获取指标
                 return {
                     "status": "success",
-                    "data": self.metrics.model_dump()
+                    "data": self.metrics.dump()
                 }
             
             else:
                 raise ValueError(f"Unknown request type: {request_type}")
                 
         except Exception as e:
-            self.logger.error(f"Error processing request: {str(e)}")
+            self.logger.error("Error processing request: %s", e)
             self.metrics.increment_error()
             return {
                 "status": "error",
@@ -130,10 +140,11 @@ class BaseSidecarEngine(ABC):
             engine_healthy = await self._check_engine_health()
             
             # 计算运行时间
-            uptime = (datetime.now() - self.created_at).total_seconds()
+            now = time.monotonic()
+            uptime = now - self._started_at
             
             # 检查心跳
-            last_heartbeat_seconds = (datetime.now() - self.last_heartbeat).total_seconds()
+            last_heartbeat_seconds = now - self._last_heartbeat_at
             heartbeat_healthy = last_heartbeat_seconds < 30  # 30秒内有心跳
             
             status = "healthy" if engine_healthy and heartbeat_healthy else "unhealthy"
@@ -152,7 +163,7 @@ class BaseSidecarEngine(ABC):
             )
             
         except Exception as e:
-            self.logger.error(f"Health check failed: {str(e)}")
+            self.logger.error("Health check failed: %s", e)
             return HealthStatus(
                 status="error",
                 engine_id=self.engine_id,
@@ -178,12 +189,12 @@ class BaseSidecarEngine(ABC):
         启动引擎
         """
         try:
-            self.logger.info(f"Starting engine {self.engine_id}")
+            self.logger.info("Starting engine %s", self.engine_id)
             await self._start_engine()
             self.status = "running"
-            self.logger.info(f"Engine {self.engine_id} started successfully")
+            self.logger.info("Engine %s started successfully", self.engine_id)
         except Exception as e:
-            self.logger.error(f"Failed to start engine {self.engine_id}: {str(e)}")
+            self.logger.error("Failed to start engine %s: %s", self.engine_id, e)
             self.status = "failed"
             raise
     
@@ -192,12 +203,12 @@ class BaseSidecarEngine(ABC):
         停止引擎
         """
         try:
-            self.logger.info(f"Stopping engine {self.engine_id}")
+            self.logger.info("Stopping engine %s", self.engine_id)
             await self._stop_engine()
             self.status = "stopped"
-            self.logger.info(f"Engine {self.engine_id} stopped successfully")
+            self.logger.info("Engine %s stopped successfully", self.engine_id)
         except Exception as e:
-            self.logger.error(f"Failed to stop engine {self.engine_id}: {str(e)}")
+            self.logger.error("Failed to stop engine %s: %s", self.engine_id, e)
             raise
     
     @abstractmethod
@@ -4,17 +4,51 @@ Sidecar 进程通信模块，实现基于 stdin/stdout 的 JSON-RPC 通信
 """
 
 import sys
-import json
+import time
+import struct
+import hashlib
 import asyncio
 import logging
-from typing import Dict, Any, Optional, Callable, Awaitable
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
 from datetime import datetime
 import traceback
 import signal
+import threading
+
+import orjson
 
 from .models import SidecarCommand, SidecarResponse
 
 
+# 流数据块的二进制帧头：帧类型 (1 字节) + 数据长度 (4 字节) + 流标识哈希 (8 字节)，其后紧跟原始数据
+# 控制帧仍是一行 JSON，首字节为 "{"，不会与 FRAME_CHUNK 混淆
+FRAME_CHUNK = 0x01
+FRAME_HEADER = struct.Struct(">BIQ")
+
+# 单条命令 (一行 JSON) 的最大长度
+STDIN_LINE_LIMIT = 16 * 1024 * 1024
+
+# 最近生成的时间戳及其生成时间，1 毫秒内的帧复用同一字符串
+_TS_CACHE: Tuple[str, float] = ("", 0.0)
+
+
+def _now_iso() -> str:
+    """当前时间的 ISO 格式字符串，1 毫秒内复用上次的结果"""
+    global _TS_CACHE
+    now = time.time()
+    cached, cached_at = _TS_CACHE
+    if 0 <= now - cached_at < 0.001:
+        return cached
+    stamp = datetime.fromtimestamp(now).isoformat()
+    _TS_CACHE = (stamp, now)
+    return stamp
+
+
+def stream_key(stream_id: str) -> int:
+    """流标识的 64 位哈希，写入数据帧头部"""
+    return int.from_bytes(hashlib.blake2b(stream_id.encode("utf-8"), digest_size=8).digest(), "big")
+
+
 class SidecarCommunicator:
     """
     Sidecar 进程通信器
@@ -32,28 +66,52 @@ class SidecarCommunicator:
         self.logger = logging.getLogger("sidecar.communicator")
         self.running = False
         self.loop = None
-        
-        # 设置信号处理器
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
+        self._stdin_reader: Optional[asyncio.StreamReader] = None
+        self._listen_task: Optional[asyncio.Task] = None
+    
+    def install_signal_handlers(self):
+        """
+        注册 SIGINT/SIGTERM 处理器，收到信号时结束命令循环
+        只能在主线程中注册，其他线程中调用时不做任何事
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = self.loop or asyncio.get_event_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._request_shutdown, sig)
+            except NotImplementedError:
+                # Windows 事件循环不支持 add_signal_handler
+                signal.signal(sig, self._signal_handler)
     
     def _signal_handler(self, signum, frame):
-        """信号处理器"""
-        self.logger.info(f"Received signal {signum}, shutting down...")
-        self.running = False
-        if self.loop:
-            self.loop.stop()
+        """信号处理器 (signal.signal 回调)"""
+        self.loop.call_soon_threadsafe(self._request_shutdown, signum)
     
-    async def start(self):
-        """启动通信循环"""
+    def _request_shutdown(self, signum):
+        """收到退出信号"""
+        self.logger.info("Received signal %s, shutting down...", signum)
+        self.stop()
+    
+    async def start(self, handle_signals: bool = True):
+        """
+        启动通信循环
+        
+        Args:
+            handle_signals: 是否注册 SIGINT/SIGTERM 处理器，由调用方自行处理信号时传 False
+        """
         self.running = True
         self.loop = asyncio.get_event_loop()
+        if handle_signals:
+            self.install_signal_handlers()
+        self._stdin_reader = await self._connect_stdin()
         self.logger.info("Sidecar communicator started")
         
         try:
-            await self._listen_for_commands()
+            self._listen_task = asyncio.ensure_future(self._listen_for_commands())
+            await self._listen_task
         except Exception as e:
-            self.logger.error(f"Communication error: {str(e)}")
+            self.logger.error("Communication error: %s", e)
             raise
         finally:
             self.running = False
@@ -62,8 +120,8 @@ class SidecarCommunicator:
     def stop(self):
         """停止通信循环"""
         self.running = False
-        if self.loop:
-            self.loop.stop()
+        if self._listen_task is not None:
+            self._listen_task.cancel()
     
     async def _listen_for_commands(self):
         """监听命令输入"""
@@ -76,10 +134,10 @@ class SidecarCommunicator:
                 
                 # 解析命令
                 try:
-                    command_data = json.loads(line)
+                    command_data = orjson.loads(line)
                     command = SidecarCommand(**command_data)
-                except (json.JSONDecodeError, ValueError) as e:
-                    self.logger.error(f"Invalid command format: {str(e)}")
+                except (orjson.JSONDecodeError, ValueError) as e:
+                    self.logger.error("Invalid command format: %s", e)
                     await self._send_error_response(
                         command_id="unknown",
                         error=f"Invalid command format: {str(e)}"
@@ -92,25 +150,43 @@ class SidecarCommunicator:
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                self.logger.error(f"Error in command loop: {str(e)}")
+                self.logger.error("Error in command loop: %s", e)
                 await asyncio.sleep(0.1)  # 短暂休息避免快速循环
     
+    async def _connect_stdin(self) -> Optional[asyncio.StreamReader]:
+        """将 stdin 接入事件循环，不支持时 (如 Windows 控制台或普通文件) 返回 None"""
+        reader = asyncio.StreamReader(limit=STDIN_LINE_LIMIT)
+        protocol = asyncio.StreamReaderProtocol(reader)
+        try:
+            await self.loop.connect_read_pipe(lambda: protocol, sys.stdin)
+        except (NotImplementedError, OSError, ValueError) as e:
+            self.logger.debug("Cannot read stdin as a pipe, using executor reads: %s", e)
+            return None
+        return reader
+    
     async def _read_stdin(self) -> Optional[str]:
         """异步读取 stdin"""
         try:
+            if self._stdin_reader is not None:
+                line = await self._stdin_reader.readline()
+                if self._stdin_reader.at_eof():
+                    # stdin 已关闭，不会再有新命令
+                    self.running = False
+                return line.decode("utf-8").strip() if line else None
+            
             loop = asyncio.get_event_loop()
             line = await loop.run_in_executor(None, sys.stdin.readline)
             return line.strip() if line else None
         except Exception as e:
-            self.logger.error(f"Error reading stdin: {str(e)}")
+            self.logger.error("Error reading stdin: %s", e)
             return None
     
     async def _handle_command(self, command: SidecarCommand):
         """处理单个命令"""
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         try:
-            self.logger.debug(f"Handling command: {command.type} (ID: {command.id})")
+            self.logger.debug("Handling command: %s (ID: %s)", command.type, command.id)
             
             # 检查超时
             if command.timeout:
@@ -129,18 +205,18 @@ class SidecarCommunicator:
             )
             
             # 记录处理时间
-            processing_time = (datetime.now() - start_time).total_seconds()
-            self.logger.debug(f"Command {command.id} processed in {processing_time:.3f}s")
+            processing_time = time.perf_counter() - start_time
+            self.logger.debug("Command %s processed in %.3fs", command.id, processing_time)
             
         except asyncio.TimeoutError:
-            self.logger.error(f"Command {command.id} timed out")
+            self.logger.error("Command %s timed out", command.id)
             await self._send_error_response(
                 command_id=command.id,
                 error="Command execution timed out",
                 error_type="TimeoutError"
             )
         except Exception as e:
-            self.logger.error(f"Error handling command {command.id}: {str(e)}")
+            self.logger.error("Error handling command %s: %s", command.id, e)
             await self._send_error_response(
                 command_id=command.id,
                 error=str(e),
@@ -171,18 +247,20 @@ class SidecarCommunicator:
     async def _send_json(self, data: Dict[str, Any]):
         """发送 JSON 数据到 stdout"""
         try:
-            json_str = json.dumps(data, default=str, ensure_ascii=False)
+            payload = orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
             loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self._write_stdout, json_str)
+            await loop.run_in_executor(None, self._write_stdout, payload)
         except Exception as e:
-            self.logger.error(f"Error sending JSON: {str(e)}")
+            self.logger.error("Error sending JSON: %s", e)
     
-    def _write_stdout(self, data: str):
-        """同步写入 stdout"""
+    def _write_stdout(self, data: bytes):
+        """同步写入 stdout (一次写入、一次刷新)"""
         try:
-            print(data, flush=True)
+            out = sys.stdout.buffer
+            out.write(data + b"\n")
+            out.flush()
         except Exception as e:
-            self.logger.error(f"Error writing to stdout: {str(e)}")
+            self.logger.error("Error writing to stdout: %s", e)
     
     async def send_notification(self, notification_type: str, data: Dict[str, Any]):
         """发送通知 (主动推送)"""
@@ -190,7 +268,7 @@ class SidecarCommunicator:
             "type": "notification",
             "notification_type": notification_type,
             "data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
         
         await self._send_json(notification)
@@ -201,7 +279,7 @@ class SidecarCommunicator:
             "type": "heartbeat",
             "engine_id": engine_id,
             "status": status,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
         
         await self._send_json(heartbeat)
@@ -264,7 +342,11 @@ class JsonRpcProtocol:
 class StreamCommunicator:
     """流式通信器 (支持大数据传输)"""
     
-    def __init__(self, chunk_size: int = 8192):
+    # 每累积这么多数据块或字节就写入并刷新一次 stdout
+    FLUSH_EVERY_CHUNKS = 16
+    FLUSH_THRESHOLD = 128 * 1024
+    
+    def __init__(self, chunk_size: int = 1024 * 1024):
         """
         初始化流式通信器
         
@@ -277,52 +359,60 @@ class StreamCommunicator:
     async def send_stream(self, data: bytes, stream_id: str):
         """发送流式数据"""
         try:
+            # 帧先累积在缓冲区中，按块数或字节数批量写入
+            pending = bytearray()
+            key = stream_key(stream_id)
+            
             # 发送流开始信号
-            await self._send_stream_header(stream_id, len(data))
+            pending += self._encode_frame(self._stream_header(stream_id, key, len(data)))
             
-            # 分块发送数据
+            # 分块发送数据 (二进制帧，不经过 base64/JSON)
+            view = memoryview(data)
+            buffered_chunks = 0
             for i in range(0, len(data), self.chunk_size):
-                chunk = data[i:i + self.chunk_size]
-                await self._send_stream_chunk(stream_id, chunk, i)
+                chunk = view[i:i + self.chunk_size]
+                pending += FRAME_HEADER.pack(FRAME_CHUNK, len(chunk), key)
+                pending += chunk
+                buffered_chunks += 1
+                if buffered_chunks >= self.FLUSH_EVERY_CHUNKS or len(pending) >= self.FLUSH_THRESHOLD:
+                    self._flush(pending)
+                    buffered_chunks = 0
             
             # 发送流结束信号
-            await self._send_stream_footer(stream_id)
+            pending += self._encode_frame(self._stream_footer(stream_id))
+            self._flush(pending)
             
         except Exception as e:
-            self.logger.error(f"Error sending stream {stream_id}: {str(e)}")
+            self.logger.error("Error sending stream %s: %s", stream_id, e)
             raise
     
-    async def _send_stream_header(self, stream_id: str, total_size: int):
-        """发送流头部"""
-        header = {
+    @staticmethod
+    def _encode_frame(frame: Dict[str, Any]) -> bytes:
+        """将一帧编码为一行 JSON"""
+        return orjson.dumps(frame) + b"\n"
+    
+    @staticmethod
+    def _flush(pending: bytearray):
+        """写出缓冲区中的帧并刷新 stdout"""
+        out = sys.stdout.buffer
+        out.write(pending)
+        out.flush()
+        pending.clear()
+    
+    def _stream_header(self, stream_id: str, key: int, total_size: int) -> Dict[str, Any]:
+        """流头部"""
+        return {
             "type": "stream_start",
             "stream_id": stream_id,
+            "stream_key": key,
             "total_size": total_size,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
-        
-        print(json.dumps(header), flush=True)
     
-    async def _send_stream_chunk(self, stream_id: str, chunk: bytes, offset: int):
-        """发送数据块"""
-        import base64
-        
-        chunk_data = {
-            "type": "stream_chunk",
-            "stream_id": stream_id,
-            "offset": offset,
-            "size": len(chunk),
-            "data": base64.b64encode(chunk).decode("utf-8")
-        }
-        
-        print(json.dumps(chunk_data), flush=True)
-    
-    async def _send_stream_footer(self, stream_id: str):
-        """发送流尾部"""
-        footer = {
+    def _stream_footer(self, stream_id: str) -> Dict[str, Any]:
+        """流尾部"""
+        return {
             "type": "stream_end",
             "stream_id": stream_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
-        
-        print(json.dumps(footer), flush=True) 
\ No newline at end of file
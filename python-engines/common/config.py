@@ -4,19 +4,36 @@ Configuration Management System
 """
 
 import os
-import json
-import yaml
+import re
 import logging
 from typing import Dict, Any, Optional, Type, TypeVar, Union
 from pathlib import Path
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields, asdict, is_dataclass
+from enum import Enum
 from abc import ABC, abstractmethod
 
+import orjson
+
 from .models import EngineConfig, EngineType
 
 
+def _yaml():
+    """按需导入 PyYAML，返回 (yaml, Loader, Dumper)，优先使用 libyaml 的 C 实现"""
+    import yaml
+    return (
+        yaml,
+        getattr(yaml, "CSafeLoader", yaml.SafeLoader),
+        getattr(yaml, "CSafeDumper", yaml.SafeDumper),
+    )
+
+
 T = TypeVar('T')
 
+# 环境变量值的类型识别
+_INT_RE = re.compile(r'[+-]?[0-9]+\Z')
+_FLOAT_RE = re.compile(r'[+-]?(?:[0-9]+\.[0-9]*|\.[0-9]+|[0-9]+(?=[eE]))(?:[eE][+-]?[0-9]+)?\Z')
+_BOOL_VALUES = {'true': True, 'false': False}
+
 
 @dataclass
 class DatabaseConfig:
@@ -61,6 +78,27 @@ class SecurityConfig:
     rate_limit: int = 100  # 请求/分钟
 
 
+# 各子配置的字段名，供 _merge 过滤未知键
+_FIELD_NAMES = {
+    cls: frozenset(f.name for f in fields(cls))
+    for cls in (DatabaseConfig, LoggingConfig, PerformanceConfig, SecurityConfig)
+}
+
+
+def _merge(cls: Type[T], defaults: T, data: Optional[Dict[str, Any]]) -> T:
+    """以 defaults 为基础，用 data 中属于 cls 的字段覆盖，创建新的配置对象"""
+    names = _FIELD_NAMES[cls]
+    values = {name: getattr(defaults, name) for name in names}
+    if data:
+        values.update((key, value) for key, value in data.items() if key in names)
+    return cls(**values)
+
+
+def _config_dict_factory(items) -> Dict[str, Any]:
+    """asdict 的 dict_factory，枚举字段保存为其值"""
+    return {key: value.value if isinstance(value, Enum) else value for key, value in items}
+
+
 @dataclass
 class SidecarConfig:
     """Sidecar 配置"""
@@ -99,6 +137,10 @@ class ConfigSource(ABC):
     def exists(self) -> bool:
         """检查配置源是否存在"""
         pass
+    
+    def invalidate(self):
+        """清除配置源的缓存 (默认没有缓存)"""
+        pass
 
 
 class FileConfigSource(ConfigSource):
@@ -109,25 +151,25 @@ class FileConfigSource(ConfigSource):
         self.logger = logging.getLogger("config.file")
     
     def load(self) -> Dict[str, Any]:
-        """加载配置文件"""
-        if not self.exists():
-            return {}
-        
+        """加载配置文件，文件不存在时返回空字典"""
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
+            with open(self.file_path, 'rb') as f:
                 if self.file_path.suffix.lower() == '.json':
-                    return json.load(f)
+                    return orjson.loads(f.read())
                 elif self.file_path.suffix.lower() in ['.yml', '.yaml']:
-                    return yaml.safe_load(f) or {}
+                    yaml, loader, _ = _yaml()
+                    return yaml.load(f, Loader=loader) or {}
                 else:
                     raise ValueError(f"Unsupported file format: {self.file_path.suffix}")
+        except (FileNotFoundError, IsADirectoryError):
+            return {}
         except Exception as e:
             self.logger.error(f"Error loading config file {self.file_path}: {str(e)}")
             return {}
     
     def exists(self) -> bool:
         """检查文件是否存在"""
-        return self.file_path.exists() and self.file_path.is_file()
+        return os.path.isfile(self.file_path)
 
 
 class EnvironmentConfigSource(ConfigSource):
@@ -136,28 +178,34 @@ class EnvironmentConfigSource(ConfigSource):
     def __init__(self, prefix: str = "LINGOSUB_"):
         self.prefix = prefix
         self.logger = logging.getLogger("config.env")
+        self._cache: Optional[Dict[str, Any]] = None
     
     def load(self) -> Dict[str, Any]:
-        """加载环境变量配置"""
+        """加载环境变量配置 (只扫描一次 os.environ，之后返回缓存结果)"""
+        if self._cache is not None:
+            return self._cache
+        
         config = {}
+        prefix = self.prefix
+        prefix_len = len(prefix)
         
         for key, value in os.environ.items():
-            if key.startswith(self.prefix):
+            if key.startswith(prefix):
                 # 移除前缀并转换为配置键
-                config_key = key[len(self.prefix):].lower()
+                config_key = key[prefix_len:].lower()
                 
                 # 尝试解析值
                 try:
                     # 尝试 JSON 解析
-                    if value.startswith(('[', '{')):
-                        config[config_key] = json.loads(value)
-                    # 布尔值
-                    elif value.lower() in ['true', 'false']:
-                        config[config_key] = value.lower() == 'true'
+                    if value[:1] in ('[', '{'):
+                        config[config_key] = orjson.loads(value)
+                    # 布尔值 (不区分大小写，只有长度匹配时才转小写)
+                    elif len(value) in (4, 5) and value.lower() in _BOOL_VALUES:
+                        config[config_key] = _BOOL_VALUES[value.lower()]
                     # 数字
-                    elif value.isdigit():
+                    elif _INT_RE.match(value):
                         config[config_key] = int(value)
-                    elif self._is_float(value):
+                    elif _FLOAT_RE.match(value):
                         config[config_key] = float(value)
                     # 字符串
                     else:
@@ -166,19 +214,16 @@ class EnvironmentConfigSource(ConfigSource):
                     self.logger.warning(f"Error parsing env var {key}: {str(e)}")
                     config[config_key] = value
         
+        self._cache = config
         return config
     
     def exists(self) -> bool:
         """检查是否存在相关环境变量"""
-        return any(key.startswith(self.prefix) for key in os.environ.keys())
+        return bool(self.load())
     
-    def _is_float(self, value: str) -> bool:
-        """检查是否为浮点数"""
-        try:
-            float(value)
-            return True
-        except ValueError:
-            return False
+    def invalidate(self):
+        """清除缓存，下次加载时重新读取环境变量"""
+        self._cache = None
 
 
 class ConfigManager:
@@ -189,6 +234,7 @@ class ConfigManager:
         self.config_sources = []
         self.logger = logging.getLogger("config.manager")
         self._config = None
+        self._engine_config: Optional[EngineConfig] = None
     
     def add_source(self, source: ConfigSource):
         """添加配置源"""
@@ -204,8 +250,9 @@ class ConfigManager:
         
         for source in self.config_sources:
             try:
-                if source.exists():
-                    source_config = source.load()
+                # 不存在的配置源 load() 返回空字典
+                source_config = source.load()
+                if source_config:
                     merged_config.update(source_config)
                     self.logger.debug(f"Loaded config from {type(source).__name__}")
             except Exception as e:
@@ -241,63 +288,33 @@ class ConfigManager:
         config.device = data.get("device", config.device)
         config.language = data.get("language", config.language)
         
-        # 性能配置
-        if "performance" in data:
-            perf_data = data["performance"]
-            config.performance = PerformanceConfig(
-                max_workers=perf_data.get("max_workers", config.performance.max_workers),
-                timeout=perf_data.get("timeout", config.performance.timeout),
-                memory_limit=perf_data.get("memory_limit", config.performance.memory_limit),
-                cpu_limit=perf_data.get("cpu_limit", config.performance.cpu_limit),
-                batch_size=perf_data.get("batch_size", config.performance.batch_size),
-                queue_size=perf_data.get("queue_size", config.performance.queue_size),
-            )
-        
-        # 日志配置
-        if "logging" in data:
-            log_data = data["logging"]
-            config.logging = LoggingConfig(
-                level=log_data.get("level", config.logging.level),
-                format=log_data.get("format", config.logging.format),
-                file_path=log_data.get("file_path", config.logging.file_path),
-                max_file_size=log_data.get("max_file_size", config.logging.max_file_size),
-                backup_count=log_data.get("backup_count", config.logging.backup_count),
-                console_output=log_data.get("console_output", config.logging.console_output),
-            )
-        
-        # 安全配置
-        if "security" in data:
-            sec_data = data["security"]
-            config.security = SecurityConfig(
-                enable_auth=sec_data.get("enable_auth", config.security.enable_auth),
-                secret_key=sec_data.get("secret_key", config.security.secret_key),
-                token_expiry=sec_data.get("token_expiry", config.security.token_expiry),
-                allowed_origins=sec_data.get("allowed_origins", config.security.allowed_origins),
-                rate_limit=sec_data.get("rate_limit", config.security.rate_limit),
-            )
-        
-        # 数据库配置
-        if "database" in data:
-            db_data = data["database"]
-            config.database = DatabaseConfig(
-                host=db_data.get("host", config.database.host),
-                port=db_data.get("port", config.database.port),
-                database=db_data.get("database", config.database.database),
-                username=db_data.get("username", config.database.username),
-                password=db_data.get("password", config.database.password),
-                max_connections=db_data.get("max_connections", config.database.max_connections),
-            )
+        # 性能、日志、安全、数据库配置
+        config.performance = _merge(PerformanceConfig, config.performance, data.get("performance"))
+        config.logging = _merge(LoggingConfig, config.logging, data.get("logging"))
+        config.security = _merge(SecurityConfig, config.security, data.get("security"))
+        config.database = _merge(DatabaseConfig, config.database, data.get("database"))
         
         # 扩展配置
         config.extensions = data.get("extensions", config.extensions)
         
         return config
     
+    def reload(self) -> T:
+        """清除所有缓存并重新加载配置"""
+        self._config = None
+        self._engine_config = None
+        for source in self.config_sources:
+            source.invalidate()
+        return self.load()
+    
     def get_engine_config(self) -> EngineConfig:
-        """获取引擎配置"""
+        """获取引擎配置 (加载后不再变化，只创建一次)"""
+        if self._engine_config is not None:
+            return self._engine_config
+        
         config = self.load()
         
-        return EngineConfig(
+        self._engine_config = EngineConfig(
             engine_id=config.engine_id,
             engine_type=config.engine_type,
             model_name=config.model_name,
@@ -307,6 +324,7 @@ class ConfigManager:
             timeout=config.performance.timeout,
             options=config.extensions
         )
+        return self._engine_config
     
     def validate(self) -> bool:
         """验证配置"""
@@ -351,11 +369,12 @@ class ConfigManager:
             
             # 序列化配置
             if format == "json":
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(self._config_to_dict(config), f, indent=2, ensure_ascii=False)
+                with open(file_path, 'wb') as f:
+                    f.write(orjson.dumps(self._config_to_dict(config), option=orjson.OPT_INDENT_2))
             elif format == "yaml":
+                yaml, _, dumper = _yaml()
                 with open(file_path, 'w', encoding='utf-8') as f:
-                    yaml.dump(self._config_to_dict(config), f, default_flow_style=False)
+                    yaml.dump(self._config_to_dict(config), f, Dumper=dumper, default_flow_style=False)
             else:
                 raise ValueError(f"Unsupported format: {format}")
             
@@ -367,14 +386,8 @@ class ConfigManager:
     
     def _config_to_dict(self, config: T) -> Dict[str, Any]:
         """配置对象转字典"""
-        if hasattr(config, '__dict__'):
-            result = {}
-            for key, value in config.__dict__.items():
-                if hasattr(value, '__dict__'):
-                    result[key] = self._config_to_dict(value)
-                else:
-                    result[key] = value
-            return result
+        if is_dataclass(config):
+            return asdict(config, dict_factory=_config_dict_factory)
         return config
 
 
@@ -53,8 +53,9 @@ class ProcessManager:
         else:
             self.communicator = None
         
-        # 信号处理
-        self._setup_signal_handlers()
+        # 信号处理 (在 start() 中注册，此时事件循环已在运行)
+        self._signals = ()
+        self._signal_task = None
         
         # 健康检查
         self.health_check_interval = 30.0
@@ -64,22 +65,38 @@ class ProcessManager:
         self.stop_event = asyncio.Event()
     
     def _setup_signal_handlers(self):
-        """设置信号处理器"""
+        """设置信号处理器 (只能在主线程中注册)"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        
+        loop = asyncio.get_running_loop()
         if sys.platform != "win32":
-            signal.signal(signal.SIGINT, self._signal_handler)
-            signal.signal(signal.SIGTERM, self._signal_handler)
-            signal.signal(signal.SIGHUP, self._signal_handler)
+            self._signals = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+            for sig in self._signals:
+                loop.add_signal_handler(sig, self._signal_handler, sig)
+        else:
+            # Windows 事件循环不支持 add_signal_handler，由 signal.signal 转交给事件循环
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(self._signal_handler, signum))
     
-    def _signal_handler(self, signum, frame):
-        """信号处理器"""
+    def _remove_signal_handlers(self):
+        """移除 add_signal_handler 注册的处理器，恢复默认行为"""
+        loop = asyncio.get_running_loop()
+        for sig in self._signals:
+            loop.remove_signal_handler(sig)
+        self._signals = ()
+    
+    def _signal_handler(self, signum):
+        """信号处理器 (在事件循环中执行)"""
         self.logger.logger.info(f"Received signal {signum}")
         
+        # 保留任务引用，避免任务在完成前被回收
         if signum in (signal.SIGINT, signal.SIGTERM):
             # 优雅关闭
-            asyncio.create_task(self.stop())
+            self._signal_task = asyncio.create_task(self.stop())
         elif signum == signal.SIGHUP:
             # 重启
-            asyncio.create_task(self.restart())
+            self._signal_task = asyncio.create_task(self.restart())
     
     async def start(self) -> bool:
         """启动进程"""
@@ -92,12 +109,16 @@ class ProcessManager:
             self.state = ProcessState.STARTING
             self.start_time = datetime.now()
             
+            # 注册信号处理器
+            self._setup_signal_handlers()
+            
             # 启动引擎
             await self.engine.start()
             
             # 启动通信器（如果存在）
             if self.communicator:
-                asyncio.create_task(self.communicator.start())
+                # 信号由进程管理器统一处理
+                asyncio.create_task(self.communicator.start(handle_signals=False))
             
             # 启动健康检查
             await self._start_health_check()
@@ -129,6 +150,9 @@ class ProcessManager:
             # 设置停止事件
             self.stop_event.set()
             
+            # 停止后不再拦截信号 (重启时由 start() 重新注册)
+            self._remove_signal_handlers()
+            
             # 停止健康检查
             if self.health_check_task:
                 self.health_check_task.cancel()
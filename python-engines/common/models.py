@@ -6,7 +6,7 @@
 from datetime import datetime
 from enum import Enum
 from typing import Dict, List, Optional, Union, Any
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, ConfigDict, PrivateAttr
 import uuid
 
 
@@ -302,6 +302,20 @@ class EngineMetrics(BaseModel):
     cpu_usage: float = Field(default=0.0, description="CPU使用率(%)")
     last_updated: datetime = Field(default_factory=datetime.now, description="更新时间")
 
+    # 最近一次 model_dump() 的结果，任何字段变化时失效
+    _dump_cache: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            super().__setattr__("_dump_cache", None)
+
+    def dump(self) -> Dict[str, Any]:
+        """序列化指标，未变化时复用上次的结果 (调用方不应修改返回的字典)"""
+        if self._dump_cache is None:
+            self._dump_cache = self.model_dump()
+        return self._dump_cache
+
     def increment_request(self):
         """增加请求计数"""
         self.total_requests += 1
@@ -9,16 +9,57 @@ import json
 import io
 import sys
 from unittest.mock import Mock, AsyncMock, patch
+from contextlib import contextmanager
 from datetime import datetime
 
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../python-engines'))
 
-from common.communication import SidecarCommunicator, JsonRpcProtocol, StreamCommunicator
+from common.communication import (
+    SidecarCommunicator, JsonRpcProtocol, StreamCommunicator, FRAME_CHUNK, FRAME_HEADER, stream_key
+)
 from common.models import SidecarCommand, SidecarResponse
 
 
+class FlushCountingBuffer(io.BytesIO):
+    """记录 flush 次数的字节缓冲区"""
+    
+    def __init__(self):
+        super().__init__()
+        self.flush_count = 0
+    
+    def flush(self):
+        self.flush_count += 1
+        super().flush()
+
+
+@contextmanager
+def captured_stdout():
+    """将 stdout 替换为内存缓冲区"""
+    buffer = FlushCountingBuffer()
+    with patch('sys.stdout', io.TextIOWrapper(buffer, encoding='utf-8')):
+        yield buffer
+
+
+def written_frames(buffer):
+    """解析写入缓冲区的帧：JSON 控制帧和二进制数据帧"""
+    raw = buffer.getvalue()
+    frames = []
+    pos = 0
+    while pos < len(raw):
+        if raw[pos] == FRAME_CHUNK:
+            _, size, key = FRAME_HEADER.unpack_from(raw, pos)
+            pos += FRAME_HEADER.size
+            frames.append({"type": "stream_chunk", "stream_key": key, "data": raw[pos:pos + size]})
+            pos += size
+        else:
+            end = raw.index(b"\n", pos)
+            frames.append(json.loads(raw[pos:end]))
+            pos = end + 1
+    return frames
+
+
 class TestSidecarCommunicator:
     """SidecarCommunicator 测试类"""
     
@@ -51,15 +92,16 @@ class TestSidecarCommunicator:
         """测试 JSON 发送"""
         test_data = {"type": "test", "message": "hello"}
         
-        with patch('builtins.print') as mock_print:
+        with captured_stdout() as stdout_buffer:
             await communicator._send_json(test_data)
             
-            # 验证调用
-            mock_print.assert_called_once()
-            call_args = mock_print.call_args[0][0]
+            # 验证写入了一行并刷新
+            frames = written_frames(stdout_buffer)
+            assert len(frames) == 1
+            assert stdout_buffer.flush_count == 1
             
             # 解析 JSON 并验证
-            parsed = json.loads(call_args)
+            parsed = frames[0]
             assert parsed["type"] == "test"
             assert parsed["message"] == "hello"
     
@@ -278,57 +320,66 @@ class TestStreamCommunicator:
         test_data = b"Hello, this is test stream data that should be split into chunks."
         stream_id = "test-stream-001"
         
-        with patch('builtins.print') as mock_print:
+        with captured_stdout() as stdout_buffer:
             await stream_communicator.send_stream(test_data, stream_id)
             
-            # 验证调用次数：header + chunks + footer
+            # 验证帧数：header + chunks + footer
             # 数据长度 66 字节，chunk_size 100，所以应该有 1 个chunk
-            expected_calls = 3  # header, 1 chunk, footer
-            assert mock_print.call_count == expected_calls
+            frames = written_frames(stdout_buffer)
+            assert len(frames) == 3  # header, 1 chunk, footer
             
             # 验证 header
-            header_call = json.loads(mock_print.call_args_list[0][0][0])
-            assert header_call["type"] == "stream_start"
-            assert header_call["stream_id"] == stream_id
-            assert header_call["total_size"] == len(test_data)
+            header_frame = frames[0]
+            assert header_frame["type"] == "stream_start"
+            assert header_frame["stream_id"] == stream_id
+            assert header_frame["stream_key"] == stream_key(stream_id)
+            assert header_frame["total_size"] == len(test_data)
             
             # 验证 chunk
-            chunk_call = json.loads(mock_print.call_args_list[1][0][0])
-            assert chunk_call["type"] == "stream_chunk"
-            assert chunk_call["stream_id"] == stream_id
-            assert chunk_call["offset"] == 0
+            chunk_frame = frames[1]
+            assert chunk_frame["type"] == "stream_chunk"
+            assert chunk_frame["stream_key"] == stream_key(stream_id)
+            assert chunk_frame["data"] == test_data
             
             # 验证 footer
-            footer_call = json.loads(mock_print.call_args_list[2][0][0])
-            assert footer_call["type"] == "stream_end"
-            assert footer_call["stream_id"] == stream_id
+            footer_frame = frames[2]
+            assert footer_frame["type"] == "stream_end"
+            assert footer_frame["stream_id"] == stream_id
     
     @pytest.mark.asyncio
     async def test_send_large_stream(self, stream_communicator):
         """测试发送大数据流"""
         # 创建大于 chunk_size 的数据
-        test_data = b"x" * 250  # 250 字节，chunk_size 是 100
+        test_data = bytes(range(250))  # 250 字节，chunk_size 是 100
         stream_id = "large-stream"
         
-        with patch('builtins.print') as mock_print:
+        with captured_stdout() as stdout_buffer:
             await stream_communicator.send_stream(test_data, stream_id)
             
-            # 应该有：header + 3 chunks + footer = 5 calls
-            assert mock_print.call_count == 5
+            # 应该有：header + 3 chunks + footer = 5 frames
+            frames = written_frames(stdout_buffer)
+            assert len(frames) == 5
+            
+            # 验证所有chunk帧
+            chunk_frames = [frame for frame in frames[1:-1] if frame["type"] == "stream_chunk"]
             
-            # 验证所有chunk调用
-            chunk_calls = [
-                json.loads(call[0][0]) 
-                for call in mock_print.call_args_list[1:-1]  # 除去header和footer
-                if json.loads(call[0][0])["type"] == "stream_chunk"
-            ]
+            assert len(chunk_frames) == 3
             
-            assert len(chunk_calls) == 3
+            # 验证数据块按顺序拼接还原
+            assert [len(frame["data"]) for frame in chunk_frames] == [100, 100, 50]
+            assert b"".join(frame["data"] for frame in chunk_frames) == test_data
+    
+    @pytest.mark.asyncio
+    async def test_send_stream_batches_flushes(self, stream_communicator):
+        """测试数据块按批刷新"""
+        # 40 个数据块：每 16 块刷新一次，结束时再刷新一次
+        test_data = b"y" * 4000
+        
+        with captured_stdout() as stdout_buffer:
+            await stream_communicator.send_stream(test_data, "batched-stream")
             
-            # 验证偏移量
-            expected_offsets = [0, 100, 200]
-            actual_offsets = [call["offset"] for call in chunk_calls]
-            assert actual_offsets == expected_offsets
+            assert len(written_frames(stdout_buffer)) == 42
+            assert stdout_buffer.flush_count == 3
 
 
 class TestModelValidation: